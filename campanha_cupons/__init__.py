@@ -0,0 +1,37 @@
+"""
+Análise da campanha de cupons como pacote importável.
+
+O pipeline (`executar_analise`) roda o mesmo SQL em um backend Spark (Databricks/cluster) ou DuckDB
+(em processo, lendo os arquivos direto do disco), e os testes estatísticos são numpy/scipy puros.
+Os notebooks `case_ifood - *.py` importam daqui as partes que não dependem de Spark.
+"""
+from campanha_cupons.backends import BackendDuckDB, BackendSpark, criar_backend
+from campanha_cupons.estatisticas import (
+    benjamini_hochberg,
+    intervalos_bootstrap,
+    media_variancia,
+    msprt_vetorizado,
+    testar_pivot,
+    welch_vetorizado,
+    ztest_proporcoes_vetorizado
+)
+from campanha_cupons.kpis import KPIsCampanha, KPIsGrupo, kpis_de_somas
+from campanha_cupons.pipeline import ResultadoAnalise, executar_analise
+
+__all__ = [
+    "BackendDuckDB",
+    "BackendSpark",
+    "criar_backend",
+    "benjamini_hochberg",
+    "intervalos_bootstrap",
+    "media_variancia",
+    "msprt_vetorizado",
+    "testar_pivot",
+    "welch_vetorizado",
+    "ztest_proporcoes_vetorizado",
+    "KPIsCampanha",
+    "KPIsGrupo",
+    "kpis_de_somas",
+    "ResultadoAnalise",
+    "executar_analise"
+]
@@ -0,0 +1,51 @@
+"""
+Execução local da análise, sem cluster:
+
+    python -m campanha_cupons --orders dados/order.json.gz --merchants dados/restaurant.csv.gz \
+        --ab-test dados/ab_test_ref.csv
+
+Aceita o Parquet gerado pela ingestão ou os arquivos brutos (CSV/JSON, com ou sem gzip).
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from campanha_cupons.backends import BACKENDS, criar_backend
+from campanha_cupons.pipeline import executar_analise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análise da campanha de cupons (teste A/B).")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="duckdb")
+    parser.add_argument("--orders", required=True)
+    parser.add_argument("--merchants", required=True)
+    parser.add_argument("--ab-test", required=True)
+    parser.add_argument("--inicio-campanha", default="2019-01-01")
+    parser.add_argument("--valor-cupom", type=float, default=10)
+    parser.add_argument("--margem", type=float, default=0.20)
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    resultado = executar_analise(
+        criar_backend(args.backend),
+        {"orders": args.orders, "merchants": args.merchants, "ab_test": args.ab_test},
+        data_inicio_campanha=args.inicio_campanha,
+        valor_cupom=args.valor_cupom,
+        margem_lucro_percentual=args.margem
+    )
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(resultado.kpis.como_pandas())
+        print(f"\nConversão: z={resultado.teste_conversao[0]:.3f}, p-valor={resultado.teste_conversao[1]:.4g}")
+        print(f"Ticket por pedido: p-valor={resultado.teste_ticket['p_valor']:.4g}")
+        print("\nTestes por cliente:")
+        print(resultado.testes_clientes)
+        print("\nSegmentos (nível completo):")
+        print(resultado.cubo_segmentos[resultado.cubo_segmentos["nivel"].str.count(" x ") == 2])
+        print("\nViabilidade:", resultado.viabilidade)
+    print(f"\nTempo total ({args.backend}): {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
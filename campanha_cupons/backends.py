@@ -0,0 +1,102 @@
+"""
+Backends de execução do pipeline: o mesmo SQL roda no Spark (cluster/Databricks) ou no DuckDB
+(em processo, lendo Parquet/CSV/JSON direto dos arquivos).
+
+Cada backend expõe três operações:
+- `registrar_arquivo(nome, caminho)`: disponibiliza um arquivo/diretório como tabela `nome`;
+- `registrar_consulta(nome, consulta, materializar=False)`: cria a tabela `nome` a partir de uma consulta;
+- `consultar(consulta)`: executa a consulta e devolve um pandas DataFrame (resultados pequenos).
+
+Os imports de `pyspark` e `duckdb` ficam nos construtores: só a dependência do backend usado é necessária.
+"""
+import os
+
+
+def formato_arquivo(caminho):
+    """Formato pela extensão (ignorando .gz): csv, json ou parquet (arquivo ou diretório)."""
+    nome = caminho.lower().rstrip("/")
+    if nome.endswith(".gz"):
+        nome = nome[:-3]
+    if nome.endswith(".csv"):
+        return "csv"
+    if nome.endswith(".json"):
+        return "json"
+    return "parquet"
+
+
+class BackendSpark:
+    """Executa as consultas no Spark SQL, registrando as tabelas como temp views."""
+
+    nome = "spark"
+
+    def __init__(self, spark=None):
+        if spark is None:
+            from pyspark.sql import SparkSession
+            spark = SparkSession.builder.getOrCreate()
+        self.spark = spark
+
+    def registrar_arquivo(self, nome, caminho):
+        formato = formato_arquivo(caminho)
+        if formato == "csv":
+            df = self.spark.read.option("header", True).csv(caminho)
+        elif formato == "json":
+            df = self.spark.read.json(caminho)
+        else:
+            df = self.spark.read.parquet(caminho)
+        df.createOrReplaceTempView(nome)
+
+    def registrar_consulta(self, nome, consulta, materializar=False):
+        self.spark.sql(consulta).createOrReplaceTempView(nome)
+        if materializar:
+            self.spark.catalog.cacheTable(nome)
+
+    def consultar(self, consulta):
+        return self.spark.sql(consulta).toPandas()
+
+
+class BackendDuckDB:
+    """Executa as consultas no DuckDB em processo (colunar, multi-thread, sem JVM nem cluster)."""
+
+    nome = "duckdb"
+
+    _LEITORES = {
+        "csv": "read_csv_auto('{caminho}', header = true)",
+        "json": "read_json_auto('{caminho}', format = 'newline_delimited')",
+        "parquet": "read_parquet('{caminho}', hive_partitioning = true)"
+    }
+
+    def __init__(self, conexao=None, threads=None):
+        if conexao is None:
+            import duckdb
+            conexao = duckdb.connect()
+        self.conexao = conexao
+        if threads is not None:
+            self.conexao.execute(f"SET threads = {int(threads)}")
+
+    def registrar_arquivo(self, nome, caminho):
+        formato = formato_arquivo(caminho)
+        if formato == "parquet" and os.path.isdir(caminho):
+            # Diretório gravado pelo Spark (com partições order_date=...)
+            caminho = os.path.join(caminho, "**", "*.parquet")
+        leitor = self._LEITORES[formato].format(caminho=caminho.replace("'", "''"))
+        self.conexao.execute(f"CREATE OR REPLACE VIEW {nome} AS SELECT * FROM {leitor}")
+
+    def registrar_consulta(self, nome, consulta, materializar=False):
+        tipo = "TABLE" if materializar else "VIEW"
+        self.conexao.execute(f"CREATE OR REPLACE TEMP {tipo} {nome} AS {consulta}")
+
+    def consultar(self, consulta):
+        return self.conexao.execute(consulta).fetchdf()
+
+
+BACKENDS = {
+    BackendSpark.nome: BackendSpark,
+    BackendDuckDB.nome: BackendDuckDB
+}
+
+
+def criar_backend(nome, **opcoes):
+    """Instancia o backend `nome` ("spark" ou "duckdb") com as opções do construtor."""
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {nome!r} (disponíveis: {sorted(BACKENDS)})")
+    return BACKENDS[nome](**opcoes)
@@ -0,0 +1,155 @@
+"""
+Benchmark do pipeline por fator de escala, sobre bases sintéticas (`campanha_cupons.sinteticos`).
+
+Cada etapa é cronometrada separadamente e registra as linhas de entrada e de saída. Etapas de join
+(`df_total`, `segmentacao`) com mais linhas na saída do que na entrada são marcadas com
+`alerta = "fanout"`: chave duplicada em uma dimensão multiplicou linhas.
+
+    python -m campanha_cupons.benchmark --fatores 0.01 0.1 1 --destino /tmp/bench_cupons
+
+Os resultados são acrescentados a `resultados.csv` no destino, para comparar execuções ao longo do tempo.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass
+
+import pandas as pd
+
+from campanha_cupons.backends import BACKENDS, criar_backend
+from campanha_cupons.pipeline import (
+    cubo_segmentos,
+    kpis_campanha,
+    registrar_bases,
+    registrar_clientes,
+    registrar_df_total,
+    registrar_metricas_clientes,
+    teste_welch_clientes
+)
+from campanha_cupons.sinteticos import ARQUIVOS, gerar_bases
+
+# Etapas de join: a saída nunca deveria ter mais linhas que a entrada
+_ETAPAS_JOIN = {"df_total", "segmentacao"}
+
+
+@dataclass(frozen=True)
+class MedicaoEtapa:
+    fator_escala: float
+    backend: str
+    etapa: str
+    segundos: float
+    linhas_entrada: int
+    linhas_saida: int
+    alerta: str
+
+
+def _contar(backend, tabela):
+    return int(backend.consultar(f"SELECT COUNT(*) AS n FROM {tabela}")["n"].iloc[0])
+
+
+def medir_pipeline(backend, caminhos, fator_escala, data_inicio_campanha="2019-01-01",
+                   valor_cupom=10, margem_lucro_percentual=0.20):
+    """
+    Executa as etapas do pipeline em `backend`, cronometrando cada uma. A contagem de linhas da
+    tabela de saída entra no tempo da etapa (no Spark, é a ação que materializa a tabela).
+    """
+    medicoes = []
+
+    def _medir(etapa, executar, linhas_entrada, tabela_saida=None):
+        inicio = time.perf_counter()
+        resultado = executar()
+        if tabela_saida:
+            linhas_saida = _contar(backend, tabela_saida)
+        else:
+            linhas_saida = len(resultado.como_pandas() if hasattr(resultado, "como_pandas") else resultado)
+        segundos = time.perf_counter() - inicio
+        alerta = "fanout" if etapa in _ETAPAS_JOIN and linhas_saida > linhas_entrada else ""
+        medicoes.append(MedicaoEtapa(fator_escala, backend.nome, etapa, segundos, linhas_entrada, linhas_saida, alerta))
+        return resultado, linhas_saida
+
+    _, pedidos = _medir("carregar", lambda: registrar_bases(backend, caminhos), 0, "pedidos")
+    _, linhas_df_total = _medir("df_total", lambda: registrar_df_total(backend), pedidos, "df_total")
+    _medir("metricas_clientes", lambda: registrar_metricas_clientes(backend, data_inicio_campanha),
+           linhas_df_total, "metricas_clientes")
+    clientes_teste = _contar(backend, "ab_test")
+    _, clientes = _medir(
+        "segmentacao", lambda: registrar_clientes(backend, data_inicio_campanha), clientes_teste, "clientes"
+    )
+    kpis, _ = _medir("kpis", lambda: kpis_campanha(backend), clientes, None)
+    _medir("testes_clientes",
+           lambda: teste_welch_clientes(backend, ["ticket_medio", "n_pedidos", "gasto_total"]), clientes)
+    _medir("cubo_segmentos", lambda: cubo_segmentos(backend), clientes)
+    _medir("viabilidade",
+           lambda: [kpis.viabilidade(valor_cupom, margem_lucro_percentual)], clientes)
+
+    return pd.DataFrame([asdict(m) for m in medicoes])
+
+
+def _pasta_bases(destino, fator, formato, semente, opcoes_geracao):
+    """
+    Pasta e parâmetros de geração das bases de um fator: formato, semente e opções de geração
+    entram no nome da pasta (as opções como hash curto), então cada combinação tem as próprias bases.
+    """
+    parametros = {"fator_escala": fator, "formato": formato, "semente": semente, **opcoes_geracao}
+    opcoes = hashlib.sha1(json.dumps(opcoes_geracao, sort_keys=True).encode()).hexdigest()[:8]
+    return os.path.join(destino, f"fator_{fator:g}-{formato}-semente_{semente}-{opcoes}"), parametros
+
+
+def executar_benchmark(destino, fatores=(0.01, 0.1, 1.0), backend="duckdb", formato="bruto",
+                       semente=42, opcoes_backend=None, **opcoes_geracao):
+    """
+    Gera (ou reaproveita) as bases de cada fator de escala em `destino` e mede o pipeline.
+    As bases só são reaproveitadas se o marcador `_GERADO` da pasta tiver os mesmos parâmetros de geração.
+    Acrescenta as medições a `destino/resultados.csv` e as devolve em um pandas DataFrame.
+    """
+    opcoes_geracao.setdefault("com_itens", False)
+    resultados = []
+    for fator in fatores:
+        pasta, parametros = _pasta_bases(destino, fator, formato, semente, opcoes_geracao)
+        marcador = os.path.join(pasta, "_GERADO")
+        gerado = None
+        if os.path.exists(marcador):
+            with open(marcador, encoding="utf-8") as arquivo:
+                gerado = json.load(arquivo)
+        if gerado == parametros:
+            caminhos = {base: os.path.join(pasta, nome) for base, nome in ARQUIVOS[formato].items()}
+        else:
+            # Pasta incompleta (sem marcador) ou com outros parâmetros: gera do zero
+            shutil.rmtree(pasta, ignore_errors=True)
+            caminhos = gerar_bases(pasta, fator, formato=formato, semente=semente, **opcoes_geracao)
+            with open(marcador, "w", encoding="utf-8") as arquivo:
+                json.dump(parametros, arquivo, sort_keys=True)
+
+        medicoes = medir_pipeline(criar_backend(backend, **(opcoes_backend or {})), caminhos, fator)
+        resultados.append(medicoes)
+
+    resultado = pd.concat(resultados, ignore_index=True)
+    resultado.insert(0, "executado_em", pd.Timestamp.now().isoformat(timespec="seconds"))
+
+    arquivo = os.path.join(destino, "resultados.csv")
+    resultado.to_csv(arquivo, mode="a", header=not os.path.exists(arquivo), index=False)
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline por fator de escala.")
+    parser.add_argument("--destino", required=True)
+    parser.add_argument("--fatores", type=float, nargs="+", default=[0.01, 0.1, 1.0])
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="duckdb")
+    parser.add_argument("--formato", choices=["bruto", "parquet"], default="bruto")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    resultado = executar_benchmark(args.destino, args.fatores, args.backend, args.formato, args.semente)
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.max_rows", None):
+        print(resultado.drop(columns="executado_em"))
+    alertas = resultado[resultado["alerta"] != ""]
+    if not alertas.empty:
+        print(f"\n{len(alertas)} etapa(s) com alerta de fanout")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Testes estatísticos vetorizados sobre estatísticas suficientes `(n, média, variância)`.
+
+Cada chamada testa todas as posições dos arrays (segmentos, lotes de simulação) de uma vez com
+numpy/scipy. Não dependem de Spark: são usados pelos notebooks (via `case_ifood - funcoes_estatisticas`)
+e pelos backends do pacote.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def welch_vetorizado(n1, m1, v1, n2, m2, v2, alpha=0.05):
+    """
+    Teste t de Welch para cada posição dos arrays (grupo 1 vs grupo 2).
+
+    Retorna um DataFrame com diferença de médias, t, graus de liberdade, p-valor bicaudal,
+    intervalo de confiança (1 - alpha) da diferença e `status_teste`:
+    - "amostra_insuficiente": algum grupo com n < 2 (ou ausente);
+    - "variancia_nula": erro padrão zero, t indefinido;
+    - "ok": teste calculado.
+    """
+    n1, m1, v1, n2, m2, v2 = (np.asarray(x, dtype=float) for x in (n1, m1, v1, n2, m2, v2))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        se1 = v1 / n1
+        se2 = v2 / n2
+        erro_padrao = np.sqrt(se1 + se2)
+        gl = (se1 + se2) ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+        diferenca = m1 - m2
+        t_stat = diferenca / erro_padrao
+
+    amostra_ok = (n1 >= 2) & (n2 >= 2) & np.isfinite(v1) & np.isfinite(v2)
+    variancia_ok = amostra_ok & (erro_padrao > 0)
+    status = np.select([~amostra_ok, ~variancia_ok], ["amostra_insuficiente", "variancia_nula"], "ok")
+
+    p_valor = np.full(t_stat.shape, np.nan)
+    margem = np.full(t_stat.shape, np.nan)
+    p_valor[variancia_ok] = 2 * stats.t.sf(np.abs(t_stat[variancia_ok]), gl[variancia_ok])
+    margem[variancia_ok] = stats.t.ppf(1 - alpha / 2, gl[variancia_ok]) * erro_padrao[variancia_ok]
+
+    return pd.DataFrame({
+        "diferenca": np.where(amostra_ok, diferenca, np.nan),
+        "t_stat": np.where(variancia_ok, t_stat, np.nan),
+        "gl": np.where(variancia_ok, gl, np.nan),
+        "p_valor": p_valor,
+        "ic_inferior": diferenca - margem,
+        "ic_superior": diferenca + margem,
+        "status_teste": status
+    })
+
+
+def benjamini_hochberg(p_valores):
+    """P-valores ajustados por Benjamini-Hochberg (FDR); posições NaN são ignoradas e mantidas."""
+    p_valores = np.asarray(p_valores, dtype=float)
+    ajustados = np.full(p_valores.shape, np.nan)
+    validos = ~np.isnan(p_valores)
+    m = validos.sum()
+    if m == 0:
+        return ajustados
+
+    p = p_valores[validos]
+    ordem = np.argsort(p)
+    escalonados = p[ordem] * m / np.arange(1, m + 1)
+    monotonos = np.minimum.accumulate(escalonados[::-1])[::-1]
+
+    resultado = np.empty(m)
+    resultado[ordem] = np.minimum(monotonos, 1.0)
+    ajustados[validos] = resultado
+    return ajustados
+
+
+def testar_pivot(pdf, grupo_1="target", grupo_2="control", alpha=0.05):
+    """
+    Aplica Welch + Benjamini-Hochberg a um pivot com colunas `{grupo}_n`, `{grupo}_mean`, `{grupo}_var`
+    (formato de `pivot_stats`). Retorna o pivot acrescido das colunas do teste e `p_valor_ajustado`.
+    """
+    resultado = welch_vetorizado(
+        pdf[f"{grupo_1}_n"], pdf[f"{grupo_1}_mean"], pdf[f"{grupo_1}_var"],
+        pdf[f"{grupo_2}_n"], pdf[f"{grupo_2}_mean"], pdf[f"{grupo_2}_var"],
+        alpha=alpha
+    )
+    resultado["p_valor_ajustado"] = benjamini_hochberg(resultado["p_valor"])
+    return pd.concat([pdf.reset_index(drop=True), resultado], axis=1)
+
+
+def media_variancia(n, soma, soma_q):
+    """Média e variância amostral (ddof=1) a partir de contagem, soma e soma dos quadrados."""
+    n, soma, soma_q = (np.asarray(x, dtype=float) for x in (n, soma, soma_q))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media = soma / n
+        variancia = np.where(n >= 2, (soma_q - soma * media) / (n - 1), np.nan)
+    # Cancelamento numérico pode deixar resíduos negativos quando a variância real é zero
+    return media, np.maximum(variancia, 0.0)
+
+
+# mSPRT com mistura normal para a diferença de médias (Johari et al., *Always Valid Inference*).
+# O p-valor e o intervalo podem ser olhados a cada nova leitura sem inflar o erro tipo I, desde que
+# se mantenha o mínimo dos p-valores e a interseção dos intervalos ao longo do tempo. `tau2` é a
+# variância da mistura: use a ordem de grandeza do efeito esperado ao quadrado.
+def msprt_vetorizado(n1, m1, v1, n2, m2, v2, tau2, alpha=0.05):
+    """
+    Estatística mSPRT, p-valor sempre válido e intervalo de confiança sempre válido da diferença
+    (grupo 1 - grupo 2) para cada posição dos arrays, no instante atual (sem histórico).
+    """
+    n1, m1, v1, n2, m2, v2 = (np.asarray(x, dtype=float) for x in (n1, m1, v1, n2, m2, v2))
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        variancia_diferenca = v1 / n1 + v2 / n2
+        diferenca = m1 - m2
+        log_razao = (
+            0.5 * np.log(variancia_diferenca / (variancia_diferenca + tau2))
+            + tau2 * diferenca ** 2 / (2 * variancia_diferenca * (variancia_diferenca + tau2))
+        )
+        p_valor = np.minimum(1.0, np.exp(-log_razao))
+        margem = np.sqrt(
+            variancia_diferenca * (variancia_diferenca + tau2) / tau2
+            * (2 * np.log(1 / alpha) + np.log((variancia_diferenca + tau2) / variancia_diferenca))
+        )
+
+    valido = (n1 >= 2) & (n2 >= 2) & (variancia_diferenca > 0)
+    return pd.DataFrame({
+        "diferenca": np.where(valido, diferenca, np.nan),
+        "log_razao_verossimilhanca": np.where(valido, log_razao, np.nan),
+        "p_valor_sempre_valido": np.where(valido, p_valor, 1.0),
+        "ic_inferior": np.where(valido, diferenca - margem, -np.inf),
+        "ic_superior": np.where(valido, diferenca + margem, np.inf)
+    })
+
+
+def ztest_proporcoes_vetorizado(x1, n1, x2, n2):
+    """
+    Teste z de duas proporções (variância combinada) para cada posição dos arrays, equivalente a
+    `proportions_ztest([x1, x2], [n1, n2])` do statsmodels. Retorna (z, p-valor bicaudal); NaN quando
+    o erro padrão é zero.
+    """
+    x1, n1, x2, n2 = (np.asarray(x, dtype=float) for x in (x1, n1, x2, n2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_combinada = (x1 + x2) / (n1 + n2)
+        erro_padrao = np.sqrt(p_combinada * (1 - p_combinada) * (1 / n1 + 1 / n2))
+        z = np.where(erro_padrao > 0, (x1 / n1 - x2 / n2) / erro_padrao, np.nan)
+    return z, 2 * stats.norm.sf(np.abs(z))
+
+
+# Somas ponderadas por (grupo, segmentos, réplica) produzidas pelo bootstrap de Poisson
+SOMAS_BOOTSTRAP = ["soma_clientes", "soma_pedidos", "soma_gasto", "soma_convertidos"]
+
+
+def intervalos_bootstrap(somas, segmentos=(), alpha=0.05, coluna_grupo="is_target",
+                         grupo_1="target", grupo_2="control"):
+    """
+    Intervalos percentis (1 - alpha) de ticket médio, receita por usuário e conversão de cada grupo
+    e do lift (grupo_1 / grupo_2 - 1), no nível `segmentos` (vazio = total).
+    """
+    segmentos = list(segmentos)
+    por_replica = (
+        somas.groupby([coluna_grupo, *segmentos, "replica"])[SOMAS_BOOTSTRAP].sum()
+        .reset_index()
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        por_replica["ticket_medio"] = por_replica["soma_gasto"] / por_replica["soma_pedidos"]
+        por_replica["receita_por_usuario"] = por_replica["soma_gasto"] / por_replica["soma_clientes"]
+        por_replica["taxa_conversao"] = por_replica["soma_convertidos"] / por_replica["soma_clientes"]
+
+    metricas = ["ticket_medio", "receita_por_usuario", "taxa_conversao"]
+    largo = por_replica.pivot_table(
+        index=[*segmentos, "replica"], columns=coluna_grupo, values=metricas
+    )
+
+    linhas = []
+    celulas = largo.groupby(level=list(range(len(segmentos)))) if segmentos else [((), largo)]
+    for celula, tabela in celulas:
+        celula = celula if isinstance(celula, tuple) else (celula,)
+        # Seleção por valor: sem segmentos, o índice é só "replica" (não é MultiIndex)
+        replica = tabela.index.get_level_values("replica")
+        observada = tabela[replica == 0]
+        replicas = tabela[replica != 0]
+        for metrica in metricas:
+            series = {
+                grupo_1: replicas[(metrica, grupo_1)].to_numpy(),
+                grupo_2: replicas[(metrica, grupo_2)].to_numpy(),
+                "lift": replicas[(metrica, grupo_1)].to_numpy() / replicas[(metrica, grupo_2)].to_numpy() - 1
+            }
+            estimativas = {
+                grupo_1: observada[(metrica, grupo_1)].iloc[0],
+                grupo_2: observada[(metrica, grupo_2)].iloc[0]
+            }
+            estimativas["lift"] = estimativas[grupo_1] / estimativas[grupo_2] - 1
+            for alvo, valores in series.items():
+                valores = valores[np.isfinite(valores)]
+                inferior, superior = (
+                    np.percentile(valores, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+                    if valores.size else (np.nan, np.nan)
+                )
+                linhas.append({
+                    **dict(zip(segmentos, celula)),
+                    "metrica": metrica,
+                    "alvo": alvo,
+                    "estimativa": estimativas[alvo],
+                    "ic_inferior": inferior,
+                    "ic_superior": superior,
+                    "replicas_validas": valores.size
+                })
+    return pd.DataFrame(linhas)
+
+
+# Limite de elementos por matriz de experimentos (lote x clientes) de cada braço do simulador de poder
+_ELEMENTOS_POR_LOTE = 2_000_000
+
+# Bases de gasto de cada processo do pool (enviadas uma vez por processo, não por desenho)
+_BASES = {}
+
+
+def inicializar_bases_simulacao(bases):
+    """Inicializador do pool de processos: guarda as bases de gasto ({segmento: array}) no processo."""
+    _BASES.clear()
+    _BASES.update(bases)
+
+
+def simular_desenho(desenho):
+    """
+    Fração de experimentos com p < alpha (poder) de um desenho
+    (segmento, métrica, efeito, n por braço, nº de simulações, alpha, semente), em lotes vetorizados.
+    """
+    segmento, metrica, efeito, n_por_braco, n_simulacoes, alpha, semente = desenho
+    gasto = _BASES[segmento]
+    rng = np.random.default_rng(semente)
+    tamanho_lote = max(1, _ELEMENTOS_POR_LOTE // n_por_braco)
+
+    rejeicoes = 0
+    for inicio in range(0, n_simulacoes, tamanho_lote):
+        lote = min(tamanho_lote, n_simulacoes - inicio)
+        if metrica == "gasto":
+            controle = gasto[rng.integers(0, gasto.size, size=(lote, n_por_braco))]
+            tratado = gasto[rng.integers(0, gasto.size, size=(lote, n_por_braco))] * (1 + efeito)
+            p_valor = welch_vetorizado(
+                np.full(lote, n_por_braco), tratado.mean(axis=1), tratado.var(axis=1, ddof=1),
+                np.full(lote, n_por_braco), controle.mean(axis=1), controle.var(axis=1, ddof=1),
+                alpha=alpha
+            )["p_valor"].to_numpy()
+        else:
+            taxa = np.mean(gasto > 0)
+            convertidos_controle = rng.binomial(n_por_braco, taxa, size=lote)
+            convertidos_tratado = rng.binomial(n_por_braco, min(1.0, taxa * (1 + efeito)), size=lote)
+            _, p_valor = ztest_proporcoes_vetorizado(convertidos_tratado, n_por_braco, convertidos_controle, n_por_braco)
+        # p-valor NaN (variância nula) conta como não rejeição
+        rejeicoes += int(np.sum(p_valor < alpha))
+
+    poder = rejeicoes / n_simulacoes
+    return {
+        "segmento": segmento,
+        "metrica": metrica,
+        "efeito_relativo": efeito,
+        "n_por_braco": n_por_braco,
+        "poder": poder,
+        "erro_monte_carlo": np.sqrt(poder * (1 - poder) / n_simulacoes)
+    }
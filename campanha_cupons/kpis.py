@@ -0,0 +1,108 @@
+"""
+KPIs de target e control e as análises derivadas (testes de conversão e ticket, viabilidade financeira).
+
+Os KPIs são construídos a partir de somas por grupo (clientes, convertidos, pedidos, n/soma/soma dos
+quadrados do ticket), calculadas em qualquer backend; daí em diante tudo roda em memória.
+"""
+from dataclasses import dataclass, asdict
+import math
+
+import pandas as pd
+from statsmodels.stats.proportion import proportions_ztest
+
+from campanha_cupons.estatisticas import media_variancia, welch_vetorizado
+
+
+@dataclass(frozen=True)
+class KPIsGrupo:
+    grupo: str
+    clientes: int
+    clientes_convertidos: int
+    pedidos: int
+    pedidos_com_valor: int
+    receita: float
+    ticket_medio: float
+    variancia_ticket: float
+
+    @property
+    def taxa_conversao(self):
+        return self.clientes_convertidos / self.clientes if self.clientes else math.nan
+
+    @property
+    def receita_por_cliente(self):
+        return self.receita / self.clientes if self.clientes else math.nan
+
+
+@dataclass(frozen=True)
+class KPIsCampanha:
+    target: KPIsGrupo
+    control: KPIsGrupo
+
+    def como_pandas(self):
+        """Uma linha por grupo, incluindo as métricas derivadas."""
+        return pd.DataFrame([
+            {**asdict(g), "taxa_conversao": g.taxa_conversao, "receita_por_cliente": g.receita_por_cliente}
+            for g in (self.target, self.control)
+        ])
+
+    def teste_conversao(self):
+        """Teste z de proporções (clientes convertidos / clientes), target vs control."""
+        return proportions_ztest(
+            [self.target.clientes_convertidos, self.control.clientes_convertidos],
+            [self.target.clientes, self.control.clientes]
+        )
+
+    def teste_ticket(self, alpha=0.05):
+        """Teste de Welch do ticket por pedido, target vs control (uma linha)."""
+        return welch_vetorizado(
+            [self.target.pedidos_com_valor], [self.target.ticket_medio], [self.target.variancia_ticket],
+            [self.control.pedidos_com_valor], [self.control.ticket_medio], [self.control.variancia_ticket],
+            alpha=alpha
+        ).iloc[0]
+
+    def viabilidade(self, valor_cupom, margem_lucro_percentual):
+        """
+        Viabilidade financeira com as premissas da seção 1b: um cupom por pedido do grupo target
+        e gasto de cada pedido igual ao ticket médio do grupo control.
+        """
+        cupons_usados = self.target.pedidos
+        transacional_estimado = cupons_usados * self.control.ticket_medio
+        custo_campanha = cupons_usados * valor_cupom
+        lucro_adicional = transacional_estimado * margem_lucro_percentual
+        return {
+            "cupons_usados": cupons_usados,
+            "ticket_medio_controle": self.control.ticket_medio,
+            "transacional_estimado": transacional_estimado,
+            "custo_campanha": custo_campanha,
+            "lucro_adicional": lucro_adicional,
+            "viavel": lucro_adicional > custo_campanha
+        }
+
+
+def kpis_de_somas(linhas, coluna_grupo="is_target"):
+    """
+    KPIsCampanha a partir de uma linha de somas por grupo (Row do Spark, dict ou similar), com
+    `clientes`, `clientes_convertidos`, `pedidos`, `ticket_n`, `ticket_soma` e `ticket_soma_q`.
+    """
+    def _soma(valor):
+        # SUM sem linhas não nulas chega como None (Row do Spark) ou NaN (pandas)
+        return 0.0 if pd.isna(valor) else float(valor)
+
+    def _grupo(nome):
+        linha = next((l for l in linhas if l[coluna_grupo] == nome), None)
+        if linha is None:
+            raise ValueError(f"Grupo '{nome}' não encontrado em {coluna_grupo}")
+        ticket_n = _soma(linha["ticket_n"])
+        media, variancia = media_variancia(ticket_n, _soma(linha["ticket_soma"]), _soma(linha["ticket_soma_q"]))
+        return KPIsGrupo(
+            grupo=nome,
+            clientes=int(linha["clientes"]),
+            clientes_convertidos=int(_soma(linha["clientes_convertidos"])),
+            pedidos=int(_soma(linha["pedidos"])),
+            pedidos_com_valor=int(ticket_n),
+            receita=_soma(linha["ticket_soma"]),
+            ticket_medio=float(media),
+            variancia_ticket=float(variancia)
+        )
+
+    return KPIsCampanha(target=_grupo("target"), control=_grupo("control"))
@@ -0,0 +1,280 @@
+"""
+Pipeline da análise (seções 1a, 1b e 2) em SQL portável, executado por qualquer backend de
+`campanha_cupons.backends`.
+
+Etapas: bases tipadas -> `df_total` (pedidos x restaurantes x teste A/B) -> `metricas_clientes`
+(uma linha por cliente com pedido) -> `clientes` (todos os clientes do teste, com segmentos) -> KPIs
+por grupo, testes por cliente e cubo de segmentos, todos a partir de somas (n, soma, soma dos
+quadrados) que chegam pequenas ao Python.
+
+O SQL usa apenas construções comuns ao Spark SQL e ao DuckDB (CAST, CASE, MAX_BY, GROUPING SETS,
+grouping_id com argumentos, INTERVAL n DAY).
+"""
+from dataclasses import dataclass
+from itertools import combinations
+
+import pandas as pd
+
+from campanha_cupons.estatisticas import media_variancia, testar_pivot, welch_vetorizado
+from campanha_cupons.kpis import KPIsCampanha, kpis_de_somas
+from campanha_cupons.segmentos import (
+    JANELA_ATIVO_DIAS,
+    SEGMENTOS,
+    expressao_localizacao_predominante,
+    expressao_segmento_atividade,
+    expressao_segmento_ticket
+)
+
+# Tabelas de origem necessárias e suas colunas tipadas (as demais colunas não são lidas)
+_BASES = {
+    "orders": ("pedidos", """
+        SELECT CAST(customer_id AS STRING) AS customer_id,
+               CAST(merchant_id AS STRING) AS merchant_id,
+               CAST(order_created_at AS TIMESTAMP) AS order_created_at,
+               CAST(order_total_amount AS DOUBLE) AS order_total_amount
+        FROM orders_fonte
+    """),
+    "merchants": ("restaurantes", """
+        SELECT CAST(id AS STRING) AS id,
+               CAST(merchant_state AS STRING) AS merchant_state
+        FROM merchants_fonte
+    """),
+    "ab_test": ("ab_test", """
+        SELECT CAST(customer_id AS STRING) AS customer_id,
+               CAST(is_target AS STRING) AS is_target
+        FROM ab_test_fonte
+    """)
+}
+
+
+def registrar_bases(backend, caminhos):
+    """
+    Registra as bases tipadas `pedidos`, `restaurantes` e `ab_test` a partir de `caminhos`
+    ({"orders": ..., "merchants": ..., "ab_test": ...}; Parquet da ingestão ou CSV/JSON brutos).
+    """
+    faltando = set(_BASES) - set(caminhos)
+    if faltando:
+        raise ValueError(f"Caminhos ausentes: {sorted(faltando)}")
+    for origem, (nome, consulta) in _BASES.items():
+        backend.registrar_arquivo(f"{origem}_fonte", caminhos[origem])
+        backend.registrar_consulta(nome, consulta)
+
+
+def registrar_df_total(backend):
+    """
+    Tabela `df_total` (materializada): pedidos dos clientes do teste A/B com grupo e estado do
+    restaurante, apenas com as colunas usadas adiante. Uma linha por pedido.
+    """
+    backend.registrar_consulta("df_total", """
+        SELECT p.customer_id,
+               a.is_target,
+               r.merchant_state,
+               p.order_created_at,
+               p.order_total_amount
+        FROM pedidos p
+        JOIN ab_test a ON p.customer_id = a.customer_id
+        LEFT JOIN restaurantes r ON p.merchant_id = r.id
+    """, materializar=True)
+
+
+def registrar_metricas_clientes(backend, data_inicio_campanha):
+    """
+    Tabela `metricas_clientes` (materializada): uma linha por cliente com pedido, com contagens,
+    gasto (soma e soma dos quadrados), `ticket_medio`, ticket médio e último pedido pré-campanha e
+    estado predominante.
+    """
+    inicio = f"TIMESTAMP '{data_inicio_campanha} 00:00:00'"
+    backend.registrar_consulta("metricas_clientes", f"""
+        WITH por_estado AS (
+            SELECT customer_id,
+                   merchant_state,
+                   COUNT(*) AS n_pedidos,
+                   COUNT(order_total_amount) AS n_valores,
+                   SUM(order_total_amount) AS receita,
+                   SUM(order_total_amount * order_total_amount) AS receita_q,
+                   COUNT(CASE WHEN order_created_at < {inicio} THEN order_total_amount END) AS n_valores_pre,
+                   SUM(CASE WHEN order_created_at < {inicio} THEN order_total_amount END) AS receita_pre,
+                   MAX(CASE WHEN order_created_at < {inicio} THEN order_created_at END) AS ultimo_pedido_pre
+            FROM df_total
+            GROUP BY customer_id, merchant_state
+        )
+        SELECT customer_id,
+               SUM(n_pedidos) AS n_pedidos,
+               SUM(n_valores) AS n_valores,
+               SUM(receita) AS gasto_total,
+               SUM(receita_q) AS gasto_q,
+               SUM(receita) / NULLIF(SUM(n_valores), 0) AS ticket_medio,
+               SUM(receita_pre) / NULLIF(SUM(n_valores_pre), 0) AS ticket_medio_pre,
+               MAX(ultimo_pedido_pre) AS ultimo_pedido_pre,
+               {expressao_localizacao_predominante("merchant_state", "n_pedidos")} AS estado_predominante
+        FROM por_estado
+        GROUP BY customer_id
+    """, materializar=True)
+
+
+def registrar_clientes(backend, data_inicio_campanha, janela_ativo_dias=JANELA_ATIVO_DIAS):
+    """
+    Tabela `clientes` (materializada): uma linha por cliente do teste A/B com as métricas de
+    `metricas_clientes` e os segmentos da seção 2 (atividade nos `janela_ativo_dias` anteriores à
+    campanha, faixa do ticket médio pré-campanha e estado predominante). Clientes sem pedido ficam com
+    0 pedidos e segmentos de ticket/localização nulos; com pedidos só na campanha, ticket "Sem histórico".
+    """
+    atividade = expressao_segmento_atividade("c.ultimo_pedido_pre", data_inicio_campanha, janela_ativo_dias)
+    backend.registrar_consulta("clientes", f"""
+        SELECT a.customer_id,
+               a.is_target,
+               COALESCE(c.n_pedidos, 0) AS n_pedidos,
+               COALESCE(c.n_valores, 0) AS n_valores,
+               c.gasto_total,
+               c.gasto_q,
+               c.ticket_medio,
+               {atividade} AS segmento_atividade,
+               CASE WHEN c.customer_id IS NOT NULL
+                    THEN {expressao_segmento_ticket("c.ticket_medio_pre")} END AS segmento_ticket,
+               c.estado_predominante AS segmento_localizacao
+        FROM ab_test a
+        LEFT JOIN metricas_clientes c ON a.customer_id = c.customer_id
+    """, materializar=True)
+
+
+def kpis_campanha(backend, coluna_grupo="is_target"):
+    """KPIsCampanha (conversão, pedidos, receita, ticket) a partir de uma agregação sobre `clientes`."""
+    somas = backend.consultar(f"""
+        SELECT {coluna_grupo},
+               COUNT(*) AS clientes,
+               SUM(CASE WHEN n_pedidos > 0 THEN 1 ELSE 0 END) AS clientes_convertidos,
+               SUM(n_pedidos) AS pedidos,
+               SUM(n_valores) AS ticket_n,
+               SUM(gasto_total) AS ticket_soma,
+               SUM(gasto_q) AS ticket_soma_q
+        FROM clientes
+        GROUP BY {coluna_grupo}
+    """)
+    return kpis_de_somas(somas.to_dict("records"), coluna_grupo)
+
+
+def teste_welch_clientes(backend, colunas, filtro="n_pedidos > 0", coluna_grupo="is_target",
+                         grupo_1="target", grupo_2="control", alpha=0.05):
+    """
+    Teste de Welch por coluna de `clientes` (por padrão, só clientes com pedido, como
+    `df_metricas_clientes` no notebook), com uma agregação de n/soma/soma dos quadrados por grupo.
+    """
+    expressoes = ",\n".join(
+        f"COUNT({c}) AS {c}_n, SUM(CAST({c} AS DOUBLE)) AS {c}_soma, "
+        f"SUM(CAST({c} AS DOUBLE) * CAST({c} AS DOUBLE)) AS {c}_soma_q"
+        for c in colunas
+    )
+    somas = backend.consultar(f"""
+        SELECT {coluna_grupo}, {expressoes}
+        FROM clientes
+        WHERE {filtro} AND {coluna_grupo} IN ('{grupo_1}', '{grupo_2}')
+        GROUP BY {coluna_grupo}
+    """).set_index(coluna_grupo).reindex([grupo_1, grupo_2])
+
+    def _estatisticas(grupo):
+        n = somas.loc[grupo, [f"{c}_n" for c in colunas]].to_numpy(dtype=float)
+        media, variancia = media_variancia(
+            n,
+            somas.loc[grupo, [f"{c}_soma" for c in colunas]].to_numpy(dtype=float),
+            somas.loc[grupo, [f"{c}_soma_q" for c in colunas]].to_numpy(dtype=float)
+        )
+        return n, media, variancia
+
+    n1, m1, v1 = _estatisticas(grupo_1)
+    n2, m2, v2 = _estatisticas(grupo_2)
+
+    resultado = welch_vetorizado(n1, m1, v1, n2, m2, v2, alpha=alpha)
+    resultado.insert(0, "metrica", list(colunas))
+    resultado.insert(1, f"{grupo_1}_n", n1)
+    resultado.insert(2, f"{grupo_2}_n", n2)
+    resultado.insert(3, f"{grupo_1}_mean", m1)
+    resultado.insert(4, f"{grupo_2}_mean", m2)
+    return resultado
+
+
+def niveis_segmentos(segmentos):
+    """Todas as combinações de segmentos, do total geral (tupla vazia) à combinação completa."""
+    return [nivel for k in range(len(segmentos) + 1) for nivel in combinations(segmentos, k)]
+
+
+def nome_nivel(nivel):
+    return " x ".join(nivel) if nivel else "geral"
+
+
+def cubo_segmentos(backend, segmentos=SEGMENTOS, niveis=None, tabela="clientes", filtro="n_pedidos > 0",
+                   n="n_valores", soma="gasto_total", soma_q="gasto_q", coluna_grupo="is_target",
+                   grupo_1="target", grupo_2="control", alpha=0.05):
+    """
+    Teste de Welch (grupo_1 vs grupo_2) em cada célula de cada nível de segmentação, com n/soma/soma
+    dos quadrados de todos os níveis em uma única passada GROUPING SETS sobre `tabela`.
+
+    Por padrão, o ticket por pedido dos clientes com pedido em `clientes` (n=n_valores,
+    soma=gasto_total, soma_q=gasto_q) em todas as combinações de `segmentos`. `niveis` é uma lista de
+    tuplas de segmentos. Retorna um pandas DataFrame com uma linha por (nivel, célula).
+    """
+    niveis = [tuple(nivel) for nivel in (niveis if niveis is not None else niveis_segmentos(segmentos))]
+    # Só segmentos presentes em algum nível podem ser argumentos de grouping_id
+    agrupados = [s for s in segmentos if any(s in nivel for nivel in niveis)]
+    # grouping_id: bit 1 para cada segmento fora do nível (o primeiro segmento é o bit mais significativo)
+    ids_niveis = {
+        sum(1 << (len(agrupados) - 1 - i) for i, s in enumerate(agrupados) if s not in nivel): nome_nivel(nivel)
+        for nivel in niveis
+    }
+    colunas_segmentos = ", ".join(agrupados)
+    conjuntos = ", ".join("(" + ", ".join(nivel) + ")" for nivel in niveis)
+    # Target e control lado a lado por agregação condicional: o grupo fica fora dos GROUPING SETS (os
+    # argumentos de grouping_id precisam ser as colunas agrupadas) e a sintaxe de PIVOT difere entre os motores
+    somas_grupos = ",\n".join(
+        f"SUM(CASE WHEN {coluna_grupo} = '{grupo}' THEN {origem} END) AS {grupo}_{estatistica}"
+        for grupo in (grupo_1, grupo_2)
+        for estatistica, origem in (("n", n), ("soma", soma), ("soma_q", soma_q))
+    )
+    condicoes = " AND ".join([f"{coluna_grupo} IN ('{grupo_1}', '{grupo_2}')"] + ([filtro] if filtro else []))
+
+    pdf = backend.consultar(f"""
+        SELECT {colunas_segmentos},
+               grouping_id({colunas_segmentos}) AS id_nivel,
+               {somas_grupos}
+        FROM {tabela}
+        WHERE {condicoes}
+        GROUP BY GROUPING SETS ({conjuntos})
+    """)
+    pdf.insert(0, "nivel", pdf.pop("id_nivel").astype(int).map(ids_niveis))
+    for posicao, segmento in enumerate(segmentos, start=1):
+        if segmento not in agrupados:
+            pdf.insert(posicao, segmento, None)
+    for grupo in (grupo_1, grupo_2):
+        pdf[f"{grupo}_mean"], pdf[f"{grupo}_var"] = media_variancia(
+            pdf[f"{grupo}_n"], pdf[f"{grupo}_soma"], pdf[f"{grupo}_soma_q"]
+        )
+
+    return testar_pivot(pdf, grupo_1, grupo_2, alpha=alpha).sort_values(["nivel", *segmentos], ignore_index=True)
+
+
+@dataclass(frozen=True)
+class ResultadoAnalise:
+    kpis: KPIsCampanha
+    teste_conversao: tuple
+    teste_ticket: pd.Series
+    testes_clientes: pd.DataFrame
+    cubo_segmentos: pd.DataFrame
+    viabilidade: dict
+
+
+def executar_analise(backend, caminhos, data_inicio_campanha="2019-01-01", janela_ativo_dias=JANELA_ATIVO_DIAS,
+                     valor_cupom=10, margem_lucro_percentual=0.20, alpha=0.05):
+    """Roda as seções 1a, 1b e 2 da análise no `backend` e devolve os resultados em memória."""
+    registrar_bases(backend, caminhos)
+    registrar_df_total(backend)
+    registrar_metricas_clientes(backend, data_inicio_campanha)
+    registrar_clientes(backend, data_inicio_campanha, janela_ativo_dias)
+
+    kpis = kpis_campanha(backend)
+    return ResultadoAnalise(
+        kpis=kpis,
+        teste_conversao=kpis.teste_conversao(),
+        teste_ticket=kpis.teste_ticket(alpha=alpha),
+        testes_clientes=teste_welch_clientes(backend, ["ticket_medio", "n_pedidos", "gasto_total"], alpha=alpha),
+        cubo_segmentos=cubo_segmentos(backend, alpha=alpha),
+        viabilidade=kpis.viabilidade(valor_cupom, margem_lucro_percentual)
+    )
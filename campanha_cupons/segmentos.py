@@ -0,0 +1,35 @@
+"""
+Regras dos segmentos da seção 2 (atividade, ticket e localização), em um só lugar para o pipeline SQL
+(`campanha_cupons.pipeline`) e os notebooks Spark.
+
+As regras são expressões SQL comuns ao Spark SQL e ao DuckDB: o pipeline as interpola nas consultas e
+os notebooks as usam com `F.expr`.
+"""
+SEGMENTOS = ["segmento_atividade", "segmento_ticket", "segmento_localizacao"]
+
+# Ativo: último pedido pré-campanha nos JANELA_ATIVO_DIAS dias anteriores ao início da campanha
+JANELA_ATIVO_DIAS = 30
+
+# Faixas do ticket médio pré-campanha, da maior para a menor (limite inferior inclusivo)
+FAIXAS_TICKET = [("Ouro", 70), ("Prata", 40)]
+FAIXA_TICKET_INFERIOR = "Bronze"
+SEM_HISTORICO = "Sem histórico"
+
+
+def expressao_segmento_atividade(ultimo_pedido_pre, data_inicio_campanha, janela_ativo_dias=JANELA_ATIVO_DIAS):
+    """'Ativo' se `ultimo_pedido_pre` cai na janela anterior à campanha; 'Inativo' caso contrário (ou nulo)."""
+    inicio = f"TIMESTAMP '{data_inicio_campanha} 00:00:00'"
+    return (f"CASE WHEN {ultimo_pedido_pre} >= {inicio} - INTERVAL {int(janela_ativo_dias)} DAY "
+            f"THEN 'Ativo' ELSE 'Inativo' END")
+
+
+def expressao_segmento_ticket(ticket_medio_pre):
+    """Faixa de `FAIXAS_TICKET` do ticket médio pré-campanha; `SEM_HISTORICO` se ele for nulo."""
+    faixas = " ".join(f"WHEN {ticket_medio_pre} >= {limite} THEN '{faixa}'" for faixa, limite in FAIXAS_TICKET)
+    return (f"CASE WHEN {ticket_medio_pre} IS NULL THEN '{SEM_HISTORICO}' {faixas} "
+            f"ELSE '{FAIXA_TICKET_INFERIOR}' END")
+
+
+def expressao_localizacao_predominante(localizacao, n_pedidos):
+    """Agregação: a `localizacao` com mais pedidos do cliente (uma linha por cliente x localização)."""
+    return f"MAX_BY({localizacao}, {n_pedidos})"
@@ -0,0 +1,259 @@
+"""
+Gerador de bases sintéticas com o mesmo layout das bases do case (README, "Descrição das tabelas").
+
+O fator de escala multiplica os volumes de referência (~3,6M pedidos, ~806k consumidores, ~7k
+restaurantes): `fator_escala=0.01` gera ~36k pedidos e `fator_escala=10`, ~36M. Os pedidos são
+gerados e gravados em lotes, então a memória não cresce com o fator de escala.
+
+Distribuições (parâmetros de `gerar_bases`):
+- estados com concentração de Zipf (`expoente_estados`): SP recebe a maior fatia de clientes e
+  restaurantes, como na base real, o que reproduz a chave concentrada de localização;
+- frequência de pedidos por cliente superdispersa (pesos gama com forma `forma_frequencia`): muitos
+  clientes com 0 ou 1 pedido e alguns muito frequentes;
+- valor do pedido log-normal em torno do ticket do cliente, com uma fração `fracao_cauda` de
+  pedidos com cauda de Pareto (`alfa_pareto`);
+- `efeito_target` multiplica o valor dos pedidos do grupo target a partir do início da campanha.
+"""
+import gzip
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+PEDIDOS_REFERENCIA = 3_600_000
+CONSUMIDORES_REFERENCIA = 806_000
+RESTAURANTES_REFERENCIA = 7_300
+
+# UF, cidade, latitude, longitude, fuso; em ordem decrescente de população (ordem da concentração)
+_ESTADOS = [
+    ("SP", "SAO PAULO", -23.55, -46.63, "America/Sao_Paulo"),
+    ("MG", "BELO HORIZONTE", -19.92, -43.94, "America/Sao_Paulo"),
+    ("RJ", "RIO DE JANEIRO", -22.91, -43.17, "America/Sao_Paulo"),
+    ("BA", "SALVADOR", -12.97, -38.50, "America/Bahia"),
+    ("PR", "CURITIBA", -25.43, -49.27, "America/Sao_Paulo"),
+    ("RS", "PORTO ALEGRE", -30.03, -51.23, "America/Sao_Paulo"),
+    ("PE", "RECIFE", -8.05, -34.88, "America/Recife"),
+    ("CE", "FORTALEZA", -3.73, -38.52, "America/Fortaleza"),
+    ("PA", "BELEM", -1.46, -48.50, "America/Belem"),
+    ("SC", "FLORIANOPOLIS", -27.59, -48.55, "America/Sao_Paulo"),
+    ("MA", "SAO LUIS", -2.53, -44.30, "America/Fortaleza"),
+    ("GO", "GOIANIA", -16.68, -49.25, "America/Sao_Paulo"),
+    ("AM", "MANAUS", -3.12, -60.02, "America/Manaus"),
+    ("ES", "VITORIA", -20.32, -40.34, "America/Sao_Paulo"),
+    ("PB", "JOAO PESSOA", -7.12, -34.86, "America/Fortaleza"),
+    ("RN", "NATAL", -5.79, -35.21, "America/Fortaleza"),
+    ("MT", "CUIABA", -15.60, -56.10, "America/Cuiaba"),
+    ("AL", "MACEIO", -9.67, -35.74, "America/Maceio"),
+    ("PI", "TERESINA", -5.09, -42.80, "America/Fortaleza"),
+    ("DF", "BRASILIA", -15.79, -47.88, "America/Sao_Paulo"),
+    ("MS", "CAMPO GRANDE", -20.47, -54.62, "America/Campo_Grande"),
+    ("SE", "ARACAJU", -10.91, -37.07, "America/Maceio"),
+    ("RO", "PORTO VELHO", -8.76, -63.90, "America/Porto_Velho"),
+    ("TO", "PALMAS", -10.18, -48.33, "America/Araguaina"),
+    ("AC", "RIO BRANCO", -9.97, -67.81, "America/Rio_Branco"),
+    ("AP", "MACAPA", 0.03, -51.07, "America/Belem"),
+    ("RR", "BOA VISTA", 2.82, -60.67, "America/Boa_Vista")
+]
+_NOMES = np.array(["ANA", "MARIA", "JOAO", "PEDRO", "LUCAS", "JULIANA", "CARLOS", "MARCOS", "FERNANDA",
+                   "PAULA", "RAFAEL", "BRUNO", "LETICIA", "GABRIEL", "BEATRIZ", "FELIPE"])
+_PRODUTOS = np.array(["PIZZA GRANDE", "X-BURGUER", "REFRIGERANTE LATA", "ACAI 500ML", "COMBO SUSHI",
+                      "PRATO FEITO", "ESFIHA", "PASTEL", "SALADA", "SUCO NATURAL", "TEMAKI", "BATATA FRITA"])
+
+INICIO_PEDIDOS = pd.Timestamp("2018-12-01")
+FIM_PEDIDOS = pd.Timestamp("2019-02-01")
+INICIO_CAMPANHA = pd.Timestamp("2019-01-01")
+
+ARQUIVOS = {
+    "bruto": {"orders": "order.json.gz", "consumers": "consumer.csv.gz",
+              "merchants": "restaurant.csv.gz", "ab_test": "ab_test_ref.csv"},
+    "parquet": {"orders": "orders", "consumers": "consumers", "merchants": "merchants", "ab_test": "ab_test"}
+}
+
+
+def _ids_hex(rng, n):
+    """Identificadores hexadecimais de 32 caracteres (mesmo formato dos ids da base real)."""
+    partes = rng.integers(0, 2 ** 63, size=(n, 2), dtype=np.int64)
+    return np.char.add(np.char.mod("%016x", partes[:, 0]), np.char.mod("%016x", partes[:, 1]))
+
+
+def _digitos(rng, n, tamanho):
+    return np.char.zfill(np.char.mod("%d", rng.integers(0, 10 ** tamanho, size=n, dtype=np.int64)), tamanho)
+
+
+def _instantes(rng, n, inicio, fim):
+    return pd.to_datetime(rng.integers(inicio.value, fim.value, size=n, dtype=np.int64)).floor("s")
+
+
+def _itens_json(rng, valores):
+    """String JSON de `items` (formato bruto: valores monetários como {value, currency})."""
+    def _valor(v):
+        return {"value": f"{v:.2f}", "currency": "BRL"}
+
+    n_itens = np.minimum(rng.poisson(0.8, size=len(valores)) + 1, 6)
+    itens = []
+    for valor, n in zip(valores, n_itens):
+        pesos = rng.dirichlet(np.ones(n))
+        quantidades = rng.integers(1, 3, size=n)
+        produtos = rng.integers(0, len(_PRODUTOS), size=n)
+        itens.append(json.dumps([
+            {
+                "name": _PRODUTOS[produto],
+                "externalId": f"{produto:08d}",
+                "quantity": f"{q:.1f}",
+                "unitPrice": _valor(valor * peso / q),
+                "totalValue": _valor(valor * peso),
+                "discount": _valor(0.0),
+                "addition": _valor(0.0),
+                "totalDiscount": _valor(0.0),
+                "totalAddition": _valor(0.0),
+                "garnishItems": []
+            }
+            for produto, q, peso in zip(produtos, quantidades, pesos)
+        ]))
+    return itens
+
+
+def _gravar(df, caminho, formato, parte=None):
+    if formato == "parquet":
+        os.makedirs(caminho, exist_ok=True)
+        df.to_parquet(os.path.join(caminho, f"part-{parte or 0:05d}.parquet"), index=False)
+    else:
+        df.to_csv(caminho, index=False)
+
+
+def gerar_bases(destino, fator_escala=1.0, formato="bruto", semente=42, expoente_estados=1.2,
+                fracao_target=0.55, forma_frequencia=0.35, ticket_mediano=40.0, sigma_valor=0.5,
+                fracao_cauda=0.02, alfa_pareto=1.8, efeito_target=0.0, com_itens=True,
+                pedidos_por_lote=500_000):
+    """
+    Gera orders, consumers, merchants e ab_test em `destino` e devolve os caminhos
+    ({"orders": ..., "consumers": ..., "merchants": ..., "ab_test": ...}).
+
+    `formato="bruto"`: arquivos como os do S3 (order.json.gz, *.csv.gz), entrada da ingestão e da
+    execução local. `formato="parquet"`: um diretório Parquet por base (requer pyarrow).
+    Com `com_itens=False`, `items` é gravado como lista vazia (geração bem mais rápida).
+    """
+    if formato not in ARQUIVOS:
+        raise ValueError(f"Formato desconhecido: {formato!r} (disponíveis: {sorted(ARQUIVOS)})")
+    os.makedirs(destino, exist_ok=True)
+    caminhos = {base: os.path.join(destino, nome) for base, nome in ARQUIVOS[formato].items()}
+    rng = np.random.default_rng(semente)
+
+    n_consumidores = max(10, round(CONSUMIDORES_REFERENCIA * fator_escala))
+    n_restaurantes = max(len(_ESTADOS), round(RESTAURANTES_REFERENCIA * fator_escala))
+    n_pedidos = max(10, round(PEDIDOS_REFERENCIA * fator_escala))
+
+    estados = pd.DataFrame(_ESTADOS, columns=["uf", "cidade", "latitude", "longitude", "fuso"])
+    prob_estados = 1.0 / np.arange(1, len(estados) + 1) ** expoente_estados
+    prob_estados /= prob_estados.sum()
+
+    # Consumidores: estado, ticket típico (log-normal) e peso de frequência (gama)
+    estado_cliente = rng.choice(len(estados), size=n_consumidores, p=prob_estados)
+    ticket_cliente = ticket_mediano * rng.lognormal(0.0, 0.45, size=n_consumidores)
+    peso_cliente = rng.gamma(forma_frequencia, size=n_consumidores)
+    ids_clientes = _ids_hex(rng, n_consumidores)
+    nomes_clientes = rng.choice(_NOMES, size=n_consumidores)
+    target = rng.random(n_consumidores) < fracao_target
+
+    _gravar(pd.DataFrame({
+        "customer_id": ids_clientes,
+        "language": rng.choice(["pt-br", "es-ar", "en-us"], size=n_consumidores, p=[0.97, 0.02, 0.01]),
+        "created_at": _instantes(rng, n_consumidores, pd.Timestamp("2015-01-01"), INICIO_PEDIDOS),
+        "active": rng.random(n_consumidores) < 0.9,
+        "customer_name": nomes_clientes,
+        "customer_phone_area": _digitos(rng, n_consumidores, 2),
+        "customer_phone_number": _digitos(rng, n_consumidores, 9)
+    }), caminhos["consumers"], formato)
+
+    _gravar(pd.DataFrame({
+        "customer_id": ids_clientes,
+        "is_target": np.where(target, "target", "control")
+    }), caminhos["ab_test"], formato)
+
+    # Restaurantes: todo estado tem ao menos um; os demais seguem a mesma concentração dos clientes
+    estado_restaurante = np.concatenate([
+        np.arange(len(estados)),
+        rng.choice(len(estados), size=n_restaurantes - len(estados), p=prob_estados)
+    ])
+    ordem = np.argsort(estado_restaurante, kind="stable")
+    estado_restaurante = estado_restaurante[ordem]
+    ids_restaurantes = _ids_hex(rng, n_restaurantes)
+    lat_restaurante = estados["latitude"].to_numpy()[estado_restaurante] + rng.normal(0, 0.05, n_restaurantes)
+    lon_restaurante = estados["longitude"].to_numpy()[estado_restaurante] + rng.normal(0, 0.05, n_restaurantes)
+    inicio_estado = np.searchsorted(estado_restaurante, np.arange(len(estados)))
+    qtd_estado = np.bincount(estado_restaurante, minlength=len(estados))
+
+    _gravar(pd.DataFrame({
+        "id": ids_restaurantes,
+        "created_at": _instantes(rng, n_restaurantes, pd.Timestamp("2010-01-01"), INICIO_PEDIDOS),
+        "enabled": rng.random(n_restaurantes) < 0.8,
+        "price_range": rng.integers(1, 6, size=n_restaurantes),
+        "average_ticket": np.round(ticket_mediano * rng.lognormal(0.0, 0.4, n_restaurantes), 2),
+        "delivery_time": rng.integers(20, 90, size=n_restaurantes).astype(float),
+        "minimum_order_value": rng.choice([0.0, 10.0, 15.0, 20.0, 30.0], size=n_restaurantes),
+        "merchant_zip_code": _digitos(rng, n_restaurantes, 5),
+        "merchant_city": estados["cidade"].to_numpy()[estado_restaurante],
+        "merchant_state": estados["uf"].to_numpy()[estado_restaurante],
+        "merchant_country": "BR"
+    }), caminhos["merchants"], formato)
+
+    # Pedidos, em lotes
+    cdf_clientes = np.cumsum(peso_cliente / peso_cliente.sum())
+    arquivo_json = gzip.open(caminhos["orders"], "wt", encoding="utf-8") if formato == "bruto" else None
+    try:
+        for parte, inicio in enumerate(range(0, n_pedidos, pedidos_por_lote)):
+            n = min(pedidos_por_lote, n_pedidos - inicio)
+            cliente = np.minimum(np.searchsorted(cdf_clientes, rng.random(n)), n_consumidores - 1)
+
+            # 85% dos pedidos em restaurantes do estado do cliente
+            estado_pedido = np.where(
+                rng.random(n) < 0.85,
+                estado_cliente[cliente],
+                rng.choice(len(estados), size=n, p=prob_estados)
+            )
+            restaurante = inicio_estado[estado_pedido] + (rng.random(n) * qtd_estado[estado_pedido]).astype(int)
+
+            criado_em = _instantes(rng, n, INICIO_PEDIDOS, FIM_PEDIDOS)
+            valor = ticket_cliente[cliente] * rng.lognormal(0.0, sigma_valor, size=n)
+            cauda = rng.random(n) < fracao_cauda
+            valor[cauda] = ticket_mediano * (1 + rng.pareto(alfa_pareto, size=cauda.sum()))
+            valor *= np.where(target[cliente] & (criado_em >= INICIO_CAMPANHA), 1 + efeito_target, 1.0)
+            valor = np.round(valor, 2)
+
+            agendado = rng.random(n) < 0.03
+            estado_entrega = estados.iloc[estado_cliente[cliente]]
+            pedidos = pd.DataFrame({
+                "cpf": _digitos(rng, n, 11),
+                "customer_id": ids_clientes[cliente],
+                "customer_name": nomes_clientes[cliente],
+                "delivery_address_city": estado_entrega["cidade"].to_numpy(),
+                "delivery_address_country": "BR",
+                "delivery_address_district": rng.choice(["CENTRO", "JARDIM", "VILA NOVA", "BELA VISTA"], size=n),
+                "delivery_address_external_id": _digitos(rng, n, 7),
+                "delivery_address_latitude": estado_entrega["latitude"].to_numpy() + rng.normal(0, 0.05, n),
+                "delivery_address_longitude": estado_entrega["longitude"].to_numpy() + rng.normal(0, 0.05, n),
+                "delivery_address_state": estado_entrega["uf"].to_numpy(),
+                "delivery_address_zip_code": _digitos(rng, n, 5),
+                "items": _itens_json(rng, valor) if com_itens else "[]",
+                "merchant_id": ids_restaurantes[restaurante],
+                "merchant_latitude": lat_restaurante[restaurante],
+                "merchant_longitude": lon_restaurante[restaurante],
+                "merchant_timezone": estados["fuso"].to_numpy()[estado_restaurante[restaurante]],
+                "order_created_at": criado_em,
+                "order_id": _ids_hex(rng, n),
+                "order_scheduled": agendado,
+                "order_total_amount": valor,
+                "origin_platform": rng.choice(["ANDROID", "IOS", "DESKTOP"], size=n, p=[0.6, 0.3, 0.1]),
+                "order_scheduled_date": pd.Series(criado_em + pd.Timedelta(hours=2)).where(agendado)
+            })
+            if arquivo_json is not None:
+                linhas = pedidos.to_json(orient="records", lines=True, date_format="iso")
+                arquivo_json.write(linhas if linhas.endswith("\n") else linhas + "\n")
+            else:
+                _gravar(pedidos, caminhos["orders"], formato, parte)
+    finally:
+        if arquivo_json is not None:
+            arquivo_json.close()
+
+    return caminhos
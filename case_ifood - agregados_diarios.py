@@ -0,0 +1,181 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Tabela Fato e Agregados Diários
+# MAGIC
+# MAGIC - `construir_df_total`: pedidos com as dimensões (A/B, merchants, consumers), apenas com as colunas pedidas.
+# MAGIC - `join_sem_fanout`: join fato x dimensão que falha se a chave repetida na dimensão multiplicar linhas do fato.
+# MAGIC - `atualizar_agregado_diario`: camada materializada (Delta) cliente x dia x localização do restaurante (estado, cidade e célula de grade lat/long) com nº de pedidos, receita, soma dos quadrados, primeiro/último pedido, grupo do teste e somas das métricas de cesta.
+# MAGIC   A atualização é incremental: só os dias a partir da data da marca d'água (maior `ultimo_pedido` já gravado) menos `dias_reprocessamento` são lidos, reagregados e substituídos (`replaceWhere`), então uma carga diária custa poucos dias de dados.
+# MAGIC   A regravação da janela é idempotente e captura pedidos que chegam atrasados (inclusive com `order_created_at` igual ou anterior à marca d'água) dentro da janela; atrasos maiores que a janela exigem `recriar=True`.
+# MAGIC - Toda leitura de pedidos das seções 1 e 2 (KPIs, métricas por cliente, cesta, localização, segmentos, sketches) sai desta camada, então nenhuma delas varre o histórico de pedidos a cada execução.
+# MAGIC
+# MAGIC Depende de `case_ifood - cesta_itens` (métricas de cesta por pedido). Use com `%run "./case_ifood - agregados_diarios"`.
+
+# COMMAND ----------
+
+from datetime import timedelta
+
+from delta.tables import DeltaTable
+from pyspark import StorageLevel
+import pyspark.sql.functions as F
+
+# COMMAND ----------
+
+def construir_df_total(df_orders, df_ab_test, df_merchants, df_consumers, colunas,
+                       estrategia_consumers="auto", storage_level=StorageLevel.MEMORY_AND_DISK):
+    """
+    Monta a tabela fato de pedidos contendo apenas `colunas` e persiste o resultado
+    no `storage_level` informado (None para não persistir).
+
+    Cada coluna vem da primeira base que a possui (orders, ab_test, merchants, consumers);
+    dimensões que não contribuem com nenhuma coluna não entram no join. Merchants e A/B
+    são pequenas e vão por broadcast. Para consumers, `estrategia_consumers` aceita
+    "broadcast", "shuffle_hash", "merge" ou "auto" (sem hint, decisão do AQE).
+    """
+    estrategias = {"broadcast", "shuffle_hash", "merge", "auto"}
+    if estrategia_consumers not in estrategias:
+        raise ValueError(f"estrategia_consumers deve ser uma de {sorted(estrategias)}")
+
+    colunas = list(dict.fromkeys(colunas))
+    pendentes = [c for c in colunas if c not in df_orders.columns]
+
+    def _colunas_da_dimensao(df_dim, chave):
+        encontradas = [c for c in pendentes if c in df_dim.columns and c != chave]
+        for c in encontradas:
+            pendentes.remove(c)
+        return encontradas
+
+    cols_ab_test = _colunas_da_dimensao(df_ab_test, "customer_id")
+    cols_merchants = _colunas_da_dimensao(df_merchants, "id")
+    cols_consumers = _colunas_da_dimensao(df_consumers, "customer_id")
+    if pendentes:
+        raise ValueError(f"Colunas não encontradas em nenhuma base: {pendentes}")
+
+    chaves_orders = ["customer_id"] + (["merchant_id"] if cols_merchants else [])
+    df_fato = df_orders.select(*dict.fromkeys(chaves_orders + [c for c in colunas if c in df_orders.columns]))
+
+    if cols_ab_test:
+        df_fato = df_fato.join(
+            F.broadcast(df_ab_test.select("customer_id", *cols_ab_test)),
+            "customer_id",
+            "left")
+
+    if cols_merchants:
+        df_fato = df_fato.join(
+            F.broadcast(df_merchants.select(F.col("id").alias("merchant_id"), *cols_merchants)),
+            "merchant_id",
+            "left")
+
+    if cols_consumers:
+        df_dim_consumers = df_consumers.select("customer_id", *cols_consumers)
+        if estrategia_consumers == "broadcast":
+            df_dim_consumers = F.broadcast(df_dim_consumers)
+        elif estrategia_consumers != "auto":
+            df_dim_consumers = df_dim_consumers.hint(estrategia_consumers)
+        df_fato = df_fato.join(df_dim_consumers, "customer_id", "left")
+
+    df_fato = df_fato.select(*colunas)
+    return df_fato.persist(storage_level) if storage_level is not None else df_fato
+
+
+def join_sem_fanout(df_fato, df_dimensao, chave, how="left", nome="join", storage_level=None):
+    """
+    Faz o join fato x dimensão e falha se o resultado tiver mais linhas que o fato.
+    Com `storage_level`, o resultado é persistido antes da contagem, que então o materializa.
+    """
+    n_antes = df_fato.count()
+    df_resultado = df_fato.join(df_dimensao, chave, how)
+    if storage_level is not None:
+        df_resultado = df_resultado.persist(storage_level)
+    n_depois = df_resultado.count()
+    if n_depois > n_antes:
+        raise ValueError(
+            f"{nome}: o join multiplicou as linhas ({n_antes} -> {n_depois}). "
+            f"A chave {chave} não é única na tabela de dimensão."
+        )
+    return df_resultado
+
+# COMMAND ----------
+
+CHAVES_AGREGADO_DIARIO = ["customer_id", "order_date", "merchant_state", "merchant_city", "celula_grade"]
+
+# Lado da célula da grade de localização, em graus (~5 km)
+TAMANHO_GRADE = 0.05
+
+
+def agregar_pedidos_por_dia(df_orders, df_ab_test, df_merchants, df_consumers):
+    """
+    Agrega pedidos em cliente x dia x localização do restaurante, com as estatísticas suficientes do
+    valor e as somas das métricas de cesta.
+    """
+    df_fato = construir_df_total(
+        df_orders.select("*", *colunas_itens_pedido()), df_ab_test, df_merchants, df_consumers,
+        ["customer_id", "order_date", "merchant_state", "merchant_city", "merchant_latitude",
+         "merchant_longitude", "is_target", "order_id", "order_created_at", "order_total_amount",
+         *METRICAS_ITENS],
+        storage_level=None
+    )
+    return (
+        df_fato
+        .withColumn("celula_grade", F.concat_ws(
+            "_",
+            F.floor(F.col("merchant_latitude") / TAMANHO_GRADE).cast("string"),
+            F.floor(F.col("merchant_longitude") / TAMANHO_GRADE).cast("string")
+        ))
+        .groupBy(*CHAVES_AGREGADO_DIARIO, "is_target")
+        .agg(
+            F.count("order_id").alias("n_pedidos"),
+            F.count("order_total_amount").alias("n_valores"),
+            F.sum("order_total_amount").alias("receita"),
+            F.sum(F.col("order_total_amount") * F.col("order_total_amount")).alias("receita_q"),
+            F.min("order_created_at").alias("primeiro_pedido"),
+            F.max("order_created_at").alias("ultimo_pedido"),
+            *agregacoes_itens()
+        )
+    )
+
+
+def atualizar_agregado_diario(spark, df_orders, df_ab_test, df_merchants, df_consumers, caminho,
+                              dias_reprocessamento=3, recriar=False):
+    """
+    Atualiza a tabela Delta de agregados diários em `caminho`, regravando os dias a partir da data da
+    marca d'água menos `dias_reprocessamento`.
+    Retorna (nova marca d'água, primeiro dia regravado), com o dia None quando a tabela é recriada.
+    """
+    if recriar or not DeltaTable.isDeltaTable(spark, caminho):
+        (
+            agregar_pedidos_por_dia(df_orders, df_ab_test, df_merchants, df_consumers)
+            .write
+            .format("delta")
+            .mode("overwrite")
+            .option("overwriteSchema", "true")
+            .partitionBy("order_date")
+            .save(caminho)
+        )
+        return spark.read.format("delta").load(caminho).agg(F.max("ultimo_pedido")).first()[0], None
+
+    df_existente = spark.read.format("delta").load(caminho)
+    marca_dagua = df_existente.agg(F.max("ultimo_pedido")).first()[0]
+
+    # Janela de reprocessamento em dias inteiros: a condição em order_date poda as partições do Parquet,
+    # e os dias da janela são substituídos por inteiro, então reexecutar não soma pedidos duas vezes
+    desde = (marca_dagua.date() - timedelta(days=dias_reprocessamento)).isoformat() if marca_dagua else None
+    df_janela = agregar_pedidos_por_dia(
+        df_orders.filter(F.col("order_date") >= F.to_date(F.lit(desde))),
+        df_ab_test, df_merchants, df_consumers
+    )
+    # Tabela vazia ou gravada com outras colunas (versão anterior da camada): recria do zero
+    if marca_dagua is None or set(df_janela.columns) != set(df_existente.columns):
+        return atualizar_agregado_diario(
+            spark, df_orders, df_ab_test, df_merchants, df_consumers, caminho, recriar=True
+        )
+
+    (
+        df_janela
+        .write
+        .format("delta")
+        .mode("overwrite")
+        .option("replaceWhere", f"order_date >= '{desde}'")
+        .save(caminho)
+    )
+    return spark.read.format("delta").load(caminho).agg(F.max("ultimo_pedido")).first()[0], desde
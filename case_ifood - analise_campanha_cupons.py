@@ -4,61 +4,120 @@
 
 # COMMAND ----------
 
-from pyspark.sql.types import StructType, StructField, StringType, DoubleType, ArrayType
-from pyspark.sql.functions import count, countDistinct, sum, avg, col, from_json, udf
+from pyspark.sql.functions import count, countDistinct, avg, col
 from pyspark.sql import SparkSession
+from pyspark import StorageLevel
 import pyspark.sql.functions as F
 from pyspark.sql.window import Window
-from scipy.stats import t
-import math
-from scipy.stats import ttest_ind
-from statsmodels.stats.proportion import proportions_ztest
+import pandas as pd
+
+# Regras dos segmentos (limiares, janela de atividade, localização predominante), as mesmas do pipeline SQL
+from campanha_cupons.segmentos import (
+    JANELA_ATIVO_DIAS,
+    SEGMENTOS,
+    expressao_localizacao_predominante,
+    expressao_segmento_ticket
+)
 
 
 # COMMAND ----------
 
 # MAGIC %md
 # MAGIC #### Mapeamento de Bases de Dados
+# MAGIC
+# MAGIC As bases são lidas do Parquet tipado gerado pelo notebook `case_ifood - ingestao_dados` (pedidos particionados por `order_date`).
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - esquemas"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - funcoes_estatisticas"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - kpis_campanha"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - agregados_diarios"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - sketches_clientes"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - cubo_segmentos"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - instrumentacao"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - localizacao"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - features_rfm"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - bootstrap"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - cesta_itens"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - simulador_poder"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - cenarios_financeiros"
 
 # COMMAND ----------
 
-#File Locations
-df_orders_path = 'hive_metastore.default.orders_data'
-df_consumers_path = 'hive_metastore.default.consumers_data'
-df_merchants_path = 'hive_metastore.default.merchants_data'
-df_ab_test_path = 'hive_metastore.default.ab_test_ref_data'
+# Coletas para o driver (toPandas) via Arrow, em lotes colunares
+spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+
+# AQE: coalescência de partições e divisão de partições concentradas em joins
+configurar_aqe(spark)
+
+# COMMAND ----------
 
 #Load data from files path
-df_orders = spark.read.table(df_orders_path)
-df_consumers = spark.table(df_consumers_path)
-df_merchants = spark.table(df_merchants_path)
-df_ab_test = spark.table(df_ab_test_path)
+df_orders = spark.read.parquet(CAMINHO_PARQUET_ORDERS)
+df_consumers = spark.read.parquet(CAMINHO_PARQUET_CONSUMERS)
+df_merchants = spark.read.parquet(CAMINHO_PARQUET_MERCHANTS)
+df_ab_test = spark.read.parquet(CAMINHO_PARQUET_AB_TEST)
 
-# Print basic info
+# Print basic info (as contagens de linhas saem dos KPIs, sem um job por tabela)
 print("Data shapes:")
-print(f"Orders: {df_orders.count()} rows, {len(df_orders.columns)} columns")
-print(f"Consumers: {df_consumers.count()} rows, {len(df_consumers.columns)} columns")
-print(f"Merchants: {df_merchants.count()} rows, {len(df_merchants.columns)} columns")
-print(f"AB: {df_merchants.count()} rows, {len(df_merchants.columns)} columns")
-
-# COMMAND ----------
-
-
-df_total = (
-    df_orders.alias('orders')
-    .join(df_ab_test,
-          'customer_id',
-          'left')
-    .join(df_merchants.alias('merchants'),
-          F.col('orders.merchant_id') == F.col('merchants.id'),
-          'left')
-    .join(df_consumers.alias('consumers'),
-          'customer_id',
-          'left')
-    .drop(F.col('merchants.id'))
+print(f"Orders: {len(df_orders.columns)} columns")
+print(f"Consumers: {len(df_consumers.columns)} columns")
+print(f"Merchants: {len(df_merchants.columns)} columns")
+print(f"AB: {len(df_ab_test.columns)} columns")
+
+# COMMAND ----------
+
+
+# Atualiza a camada agregada cliente x dia regravando só os últimos dias (marca d'água - janela)
+marca_dagua, reprocessado_desde = atualizar_agregado_diario(
+    spark, df_orders, df_ab_test, df_merchants, df_consumers, CAMINHO_AGREGADO_CLIENTES_DIA
 )
+print(f"Agregados diários atualizados até {marca_dagua}")
 
-display(df_total)
+# As seções 1 e 2 leem os agregados compactos (cliente x dia x localização), não os pedidos
+df_agregado_diario = (
+    spark.read.format("delta").load(CAMINHO_AGREGADO_CLIENTES_DIA)
+    .persist(StorageLevel.MEMORY_AND_DISK)
+)
+print(f"df_agregado_diario: {df_agregado_diario.count()} linhas")
+display(df_agregado_diario.limit(1000))
 
 # COMMAND ----------
 
@@ -80,28 +139,62 @@ display(df_total)
 
 # COMMAND ----------
 
+# DBTITLE 1,KPIs da Campanha
+
+# Clientes, convertidos, pedidos, receita e ticket (média/variância) de cada grupo em um único job
+kpis = calcular_kpis_campanha(df_agregado_diario, df_ab_test)
+display(kpis.como_pandas())
+
+teste_ticket_pedido = kpis.teste_ticket()
+print(f"Ticket por pedido - Target: R${kpis.target.ticket_medio:.2f} | Controle: R${kpis.control.ticket_medio:.2f}")
+print(f"p-valor (ticket por pedido): {teste_ticket_pedido['p_valor']}")
+
+# COMMAND ----------
+
 # DBTITLE 1,Impacto no Ticket Médio
 
-# Agrupar por cliente
-df_metricas_clientes = (
-    df_total.groupBy("customer_id", "is_target")
+# Métricas de cesta por cliente (somas por pedido gravadas nos agregados diários)
+df_itens_clientes = metricas_itens_clientes(df_agregado_diario)
+
+# Agrupar por cliente (somando os agregados diários)
+df_clientes_agregado = (
+    df_agregado_diario.groupBy("customer_id", "is_target")
     .agg(
-        count("order_id").alias("n_pedidos"),
-        sum("order_total_amount").alias("gasto_total"),
-        avg("order_total_amount").alias("ticket_medio")
+        F.sum("n_pedidos").alias("n_pedidos"),
+        F.sum("n_valores").alias("n_valores"),
+        F.sum("receita").alias("gasto_total"),
+        F.sum("receita_q").alias("gasto_q")
     )
+    .withColumn("ticket_medio", col("gasto_total") / col("n_valores"))
 )
-display(df_metricas_clientes)
-df_metricas_pd = df_metricas_clientes.toPandas()
 
+# Métricas de cada etapa (tempo, shuffle, spill, linhas por join), gravadas ao final da seção 2
+metricas_etapas = []
+
+# Juntar as métricas de cesta (1 linha por cliente; falha se o join multiplicar clientes)
+df_metricas_clientes, metrica = medir_etapa(spark, "metricas_clientes", lambda: join_sem_fanout(
+    df_clientes_agregado,
+    df_itens_clientes,
+    "customer_id",
+    nome="clientes x itens",
+    storage_level=StorageLevel.MEMORY_AND_DISK
+))
+metricas_etapas.append(metrica)
+display(df_metricas_clientes)
 
-# Separar os grupos
-grupo_teste = df_metricas_pd[df_metricas_pd['is_target'] == 'target']
-grupo_controle = df_metricas_pd[df_metricas_pd['is_target'] == 'control']
+# Teste t (Welch) para ticket médio, nº de pedidos e gasto total por cliente,
+# calculado a partir de n, soma e soma dos quadrados de cada grupo (sem coletar os clientes)
+resultado_clientes = teste_welch_spark(df_metricas_clientes, ["ticket_medio", "n_pedidos", "gasto_total"])
+display(resultado_clientes)
 
-# Teste t para ticket médio
-t_stat, p_valor = ttest_ind(grupo_teste["ticket_medio"], grupo_controle["ticket_medio"], equal_var=False)
+# Composição da cesta: o cupom mudou a quantidade/variedade de itens ou o desconto por cliente?
+resultado_cesta = teste_welch_spark(
+    df_metricas_clientes,
+    ["itens_por_pedido", "itens_distintos_por_pedido", "valor_bruto_itens", "desconto_itens", "percentual_desconto"]
+)
+display(resultado_cesta)
 
+p_valor = resultado_clientes.set_index("metrica").loc["ticket_medio", "p_valor"]
 print(f"p-valor (ticket médio): {p_valor}")
 
 
@@ -110,35 +203,11 @@ print(f"p-valor (ticket médio): {p_valor}")
 
 # DBTITLE 1,Quem passou a comprar por ter recebido cupom
 
-# Identificar quem fez ao menos 1 pedido
-df_conversao = (
-    df_total.select("customer_id", "is_target")
-    .dropDuplicates()
-    .groupBy("is_target")
-    .count()
-    .withColumnRenamed("count", "clientes_com_pedido")
-)
-
-# Total de clientes em cada grupo (com base no df_ab_test)
-df_total_clientes = df_ab_test.groupBy("is_target").count().withColumnRenamed("count", "total_clientes")
-
-# Unir os dados
-df_conv_final = df_total_clientes.join(df_conversao, on="is_target", how="left").fillna(0)
-
-# Coletar resultados
-conv_pd = df_conv_final.toPandas()
-grupo_teste = conv_pd[conv_pd["is_target"] == "target"]
-grupo_controle = conv_pd[conv_pd["is_target"] == "control"]
+# Clientes com ao menos 1 pedido sobre o total de clientes de cada grupo (já calculados nos KPIs)
+z_stat, p_valor_conv = kpis.teste_conversao()
 
-# Valores para o teste z
-successes = [int(grupo_teste["clientes_com_pedido"]), int(grupo_controle["clientes_com_pedido"])]
-totals = [int(grupo_teste["total_clientes"]), int(grupo_controle["total_clientes"])]
-
-# Teste z de proporções
-z_stat, p_valor_conv = proportions_ztest(successes, totals)
-
-print(f"Taxa de conversão - Grupo Teste: {successes[0] / totals[0]:.2%}")
-print(f"Taxa de conversão - Grupo Controle: {successes[1] / totals[1]:.2%}")
+print(f"Taxa de conversão - Grupo Teste: {kpis.target.taxa_conversao:.2%}")
+print(f"Taxa de conversão - Grupo Controle: {kpis.control.taxa_conversao:.2%}")
 print(f"p-valor (conversão): {p_valor_conv}")
 
 # COMMAND ----------
@@ -158,24 +227,12 @@ print(f"p-valor (conversão): {p_valor_conv}")
 valor_cupom = 10  # valor do cupom em reais
 margem_lucro_percentual = 0.20  # margem de lucro de 20%
 
-# Calculando o número de cupons usados (grupo teste)
-cupons_usados = df_total.filter(df_total.is_target == 'target').count()
-
-# Ticket médio do grupo controle
-ticket_medio_controle = (
-    df_total
-    .filter(df_total.is_target == 'control')
-    .agg(F.avg('order_total_amount').alias('ticket_medio_controle'))
-    .collect()[0]['ticket_medio_controle']
-)
-# Gasto adicional estimado (sem aumento no ticket, usa-se o ticket do controle)
-transacional_estimado = cupons_usados * ticket_medio_controle
-
-# Custo total da campanha (valor do cupom * número de cupons usados)
-custo_campanha = cupons_usados * valor_cupom
-
-# Cálculo do lucro adicional gerado (gasto adicional * margem de lucro)
-lucro_adicional = transacional_estimado * margem_lucro_percentual
+# Cupons usados (pedidos do grupo teste), ticket médio do controle e resultado,
+# todos a partir dos KPIs já calculados
+viabilidade = kpis.viabilidade(valor_cupom, margem_lucro_percentual)
+transacional_estimado = viabilidade["transacional_estimado"]
+custo_campanha = viabilidade["custo_campanha"]
+lucro_adicional = viabilidade["lucro_adicional"]
 
 # Comparação entre lucro e custo da campanha
 print(f"Transacional Estimado: R${transacional_estimado:.2f}")
@@ -238,13 +295,14 @@ else:
 # MAGIC
 # MAGIC - **Ativo:** consumidores com pedidos recentes (ex: nos últimos 30 dias antes da campanha)
 # MAGIC - **Inativo:** consumidores sem pedidos nos últimos 30 dias
+# MAGIC - Calculado a partir dos pedidos anteriores a `DATA_INICIO_CAMPANHA` (features de recência e frequência), e não da flag estática `active` da base de consumidores.
 # MAGIC
 # MAGIC **Racional:** identificar se a campanha funciona melhor para reativar clientes inativos ou manter os ativos engajados.
 # MAGIC
 # MAGIC
 # MAGIC **2. Localização**
 # MAGIC
-# MAGIC - Segmentação por estado ou cidade, com base na coluna `delivery_address_state` ou `delivery_address_city`
+# MAGIC - Segmentação por estado ou cidade do restaurante, com base na coluna `merchant_state` ou `merchant_city` (a mesma localização em todas as etapas)
 # MAGIC
 # MAGIC **Racional:** diferentes regiões podem ter comportamentos de consumo distintos, além de diferentes níveis de concorrência ou maturidade da base.
 # MAGIC
@@ -255,6 +313,8 @@ else:
 # MAGIC   -   **Ouro:** >= 70   
 # MAGIC   -   **Prata:** >= 40 e < 70
 # MAGIC   -   **Bronze:** < 40
+# MAGIC   -   **Sem histórico:** sem pedidos antes da campanha
+# MAGIC - Apenas pedidos anteriores a `DATA_INICIO_CAMPANHA`: o ticket do período da campanha é afetado pelo cupom e não pode definir o segmento.
 # MAGIC
 # MAGIC **Racional:** entender se o cupom é mais eficaz para incentivar gastos de quem já consome muito ou para atrair os de baixo ticket.
 
@@ -265,172 +325,253 @@ else:
 
 # COMMAND ----------
 
+# DBTITLE 1,Features de recência e frequência pré-campanha
 
-# 1. Segmentação por Atividade (Ativos vs Inativos)
-df_segmentado_atividade = (
-    df_total
-    .withColumn("segmento_atividade", 
-                F.when(F.col("active") == True, "Ativo")
-                .otherwise("Inativo")
-                )
-    .select("customer_id", "order_total_amount", "delivery_address_city", "is_target", "segmento_atividade")
-)
+# Premissa: a campanha começa em DATA_INICIO_CAMPANHA; os pedidos anteriores formam o período pré-campanha
+DATA_INICIO_CAMPANHA = "2019-01-01"
 
-# 2. Segmentação por Ticket Médio (Ouro, Prata, Bronze) – apenas com customer_id e segmento
-df_segmentado_ticket = (
-    df_total
-    .select("customer_id", "order_total_amount")
-    .withColumn("segmento_ticket",
-                F.when(F.col("order_total_amount") >= 70, "Ouro")
-                .when((F.col("order_total_amount") >= 40) & (F.col("order_total_amount") < 70), "Prata")
-                .otherwise("Bronze")
-                )
-    .select("customer_id", "segmento_ticket")
-)
+# Recência, frequência, gasto e intervalos entre pedidos antes da campanha (uma ordenação por cliente)
+df_rfm = features_rfm(df_orders, DATA_INICIO_CAMPANHA, janela_ativo_dias=JANELA_ATIVO_DIAS)
 
-# 3. Segmentação por Localização
-df_segmentado_localizacao = (
-    df_total
-    .select("customer_id", "merchant_state")
-    .withColumn("segmento_localizacao", 
-                col("merchant_state")
-                )
-    .select("customer_id", "segmento_localizacao")
-)
+# Todos os clientes do teste, inclusive os sem pedidos pré-campanha (Inativos)
+df_atividade = completar_features_rfm(df_ab_test, df_rfm).persist(StorageLevel.MEMORY_AND_DISK)
+_, metrica = medir_etapa(spark, "features_rfm", df_atividade.count)
+metricas_etapas.append(metrica)
+display(df_atividade.limit(1000))
+
+# Checagem de balanceamento: as features pré-campanha não devem diferir entre target e control
+display(teste_welch_spark(
+    df_atividade,
+    ["frequencia_pre", "gasto_pre", "dias_desde_ultimo_pedido", "intervalo_medio_dias"]
+))
+
+# COMMAND ----------
 
-# 4. Unindo segmentações (sem ambiguidade)
-df_segmentado = (
-    df_segmentado_atividade
-    .join(
-        df_segmentado_ticket, 
-        "customer_id", 
-        "left")
-    .join(
-        df_segmentado_localizacao, 
-        "customer_id", 
-        "left")
+# 1. Tabela de segmentos por cliente (uma linha por customer_id, a partir dos agregados diários)
+#    - Atividade: pedido nos 30 dias anteriores à campanha (features RFM)
+#    - Ticket: ticket médio do cliente antes da campanha (Ouro, Prata, Bronze, Sem histórico)
+#    - Localização: estado com mais pedidos do cliente
+#    (regras de campanha_cupons/segmentos.py, as mesmas do pipeline SQL)
+pre_campanha = F.col("order_date") < F.to_date(F.lit(DATA_INICIO_CAMPANHA))
+dim_segmentos = (
+    df_agregado_diario
+    .groupBy("customer_id", "merchant_state")
+    .agg(
+        F.sum("n_pedidos").alias("n_pedidos"),
+        F.sum(F.when(pre_campanha, F.col("n_valores"))).alias("n_valores_pre"),
+        F.sum(F.when(pre_campanha, F.col("receita"))).alias("receita_pre")
+    )
+    .groupBy("customer_id")
+    .agg(
+        (F.sum("receita_pre") / F.sum("n_valores_pre")).alias("ticket_medio_historico"),
+        F.expr(expressao_localizacao_predominante("merchant_state", "n_pedidos")).alias("estado_predominante")
+    )
+    .join(df_atividade.select("customer_id", "segmento_atividade"), "customer_id", "left")
+    .fillna({"segmento_atividade": "Inativo"})
+    .withColumn("segmento_ticket", F.expr(expressao_segmento_ticket("ticket_medio_historico")))
+    .withColumn("segmento_localizacao", F.col("estado_predominante"))
+    .select("customer_id", "segmento_atividade", "segmento_ticket", "segmento_localizacao")
 )
 
-# 5. Agrupamento por segmentos + análise
+# 2. Unindo segmentações às métricas por cliente (um cliente -> um segmento)
+df_segmentado, metrica = medir_etapa(spark, "segmentacao", lambda: join_sem_fanout(
+    df_metricas_clientes,
+    dim_segmentos,
+    "customer_id",
+    nome="clientes x dim_segmentos",
+    storage_level=StorageLevel.MEMORY_AND_DISK
+))
+metricas_etapas.append(metrica)
+
+# 3. Agrupamento por segmentos + análise
+#    (localização concentrada em poucos estados: agregação em dois estágios quando necessário)
 df_segmentado_analise = (
-    df_segmentado
-    .groupBy("segmento_atividade", "segmento_ticket", "segmento_localizacao", "is_target")
-    .agg(
-        F.countDistinct("customer_id").alias("total_customers"),
-        F.sum("order_total_amount").alias("total_sales"),
-        F.avg("order_total_amount").alias("avg_ticket"),
-        F.count(F.when(F.col("order_total_amount").isNotNull(), 1)).alias("converted_customers"))
+    agregar_localizacao(
+        df_segmentado.withColumn("cliente_convertido", F.when(F.col("n_pedidos") > 0, F.col("customer_id"))),
+        ["segmento_atividade", "segmento_ticket", "segmento_localizacao", "is_target"],
+        {
+            "total_customers": ("count_distinct", "customer_id"),
+            "total_sales": ("sum", "gasto_total"),
+            "n_valores": ("sum", "n_valores"),
+            "converted_customers": ("count", "cliente_convertido")
+        }
+    )
+    .withColumn("avg_ticket", F.col("total_sales") / F.col("n_valores"))
+    .drop("n_valores")
 )
 
-# 6. Calculando taxa de conversão
+# 4. Calculando taxa de conversão
 df_segmentado_analise = (
     df_segmentado_analise
     .withColumn("conversion_rate", 
                 F.col("converted_customers") / F.col("total_customers") * 100)
 )
 
-# 7. Mostrando os resultados por segmento
-df_segmentado_analise.show()
+# 5. Mostrando os resultados por segmento (a etapa medida é a única execução da agregação)
+pdf_segmentado_analise, metrica = medir_etapa(spark, "agregacao_segmentos", df_segmentado_analise.toPandas)
+metricas_etapas.append(metrica)
+display(pdf_segmentado_analise)
 
-# 8. Filtrando apenas grupo teste
-df_segmentado_analise_resultado = df_segmentado_analise.filter(F.col("is_target") == "target")
-df_segmentado_analise_resultado.show()
+# 6. Filtrando apenas grupo teste
+pdf_segmentado_analise_resultado = pdf_segmentado_analise[pdf_segmentado_analise["is_target"] == "target"]
+display(pdf_segmentado_analise_resultado)
 
-# 9. Preparando amostras para exportar e usar t-test fora do PySpark
-df_test = (
-    df_segmentado
-    .filter(F.col("is_target") == "target")
-    .select("segmento_atividade", "segmento_ticket", "segmento_localizacao", "order_total_amount")
-    )
+# COMMAND ----------
 
-df_control = (
-    df_segmentado
-    .filter(F.col("is_target") == "control")
-    .select("segmento_atividade", "segmento_ticket", "segmento_localizacao", "order_total_amount")
+# DBTITLE 1,Clientes distintos por recorte (sketches HLL)
+
+# Sketches por dia x grupo x segmento, regravados só nos dias reprocessados dos agregados diários
+atualizar_sketches_diarios(
+    spark, df_agregado_diario, dim_segmentos, CAMINHO_SKETCHES_CLIENTES_DIA, desde=reprocessado_desde
 )
+df_sketches = spark.read.format("delta").load(CAMINHO_SKETCHES_CLIENTES_DIA).cache()
+df_sketch_atribuicao = sketches_atribuicao(df_atividade).cache()
+
+# Qualquer recorte sai da união dos sketches, sem reprocessar pedidos
+display(contar_clientes_distintos(df_sketches, ["segmento_ticket", "is_target"]))
+display(contar_clientes_distintos(df_sketches, ["segmento_localizacao", "is_target"]))
+display(taxa_conversao_sketches(df_sketches, df_sketch_atribuicao, ["is_target", "segmento_atividade"]))
 
+# Relatório final: mesma contagem em modo exato
+df_clientes_dia = clientes_por_dia_segmento(df_agregado_diario, dim_segmentos)
+display(contar_clientes_distintos(df_sketches, ["segmento_ticket", "is_target"], exato=True, df_clientes=df_clientes_dia))
 
 # COMMAND ----------
 
-# Selecionar somente as colunas necessárias
-df_export = df_segmentado.select(
-    "segmento_atividade", 
-    "segmento_ticket", 
-    "segmento_localizacao", 
-    "is_target", 
-    "order_total_amount"
-)
+# DBTITLE 1,Localização mais fina (cidade / grade) e efeito do salt nas tarefas
 
-# 1. Agrupar por segmento e grupo (target/control) e calcular as estatísticas
-agg_stats = (
-    df_export
-    .groupBy("segmento_atividade", "segmento_ticket", "segmento_localizacao", "is_target")
-    .agg(
-        F.count("order_total_amount").alias("n"),
-        F.avg("order_total_amount").alias("mean"),
-        F.variance("order_total_amount").alias("var")
+# Localização predominante de cada cliente por cidade e por grade de ~5km (0,05 grau);
+# o agrupamento é por cliente, então a concentração em SP não afeta esta etapa
+for nivel in ["cidade", "grade"]:
+    df_localizacao = (
+        localizacao_predominante(df_agregado_diario, nivel)
+        .join(df_metricas_clientes, "customer_id")
     )
+    agregacoes_localizacao = {
+        "clientes": ("count_distinct", "customer_id"),
+        "pedidos": ("sum", "n_pedidos"),
+        "receita": ("sum", "gasto_total")
+    }
+
+    # Mesma agregação pelos dois caminhos: compare a razão max/mediana do tempo das tarefas
+    _, tarefas_direto = medir_tarefas(
+        spark, f"localizacao-{nivel}-aqe",
+        lambda: agregar_localizacao(df_localizacao, ["segmento_localizacao", "is_target"],
+                                    agregacoes_localizacao, estrategia="aqe").collect()
+    )
+    _, tarefas_salt = medir_tarefas(
+        spark, f"localizacao-{nivel}-salt",
+        lambda: agregar_localizacao(df_localizacao, ["segmento_localizacao", "is_target"],
+                                    agregacoes_localizacao, estrategia="salt").collect()
+    )
+    display(pd.concat([tarefas_direto, tarefas_salt], ignore_index=True))
+
+# COMMAND ----------
+
+# 1. Ticket por pedido: n/média/variância de todas as combinações de segmentos (cada um isolado,
+#    pares e a combinação completa) em uma única passada GROUPING SETS sobre a base por cliente,
+#    com Welch e p-valor ajustado (Benjamini-Hochberg) em cada célula
+resultados_cubo, metrica = medir_etapa(
+    spark, "cubo_segmentos",
+    lambda: cubo_segmentos(df_segmentado, SEGMENTOS, n="n_valores", soma="gasto_total", soma_q="gasto_q")
 )
+metricas_etapas.append(metrica)
+display(resultados_cubo)
 
-# 2. Separar target e control em colunas diferentes (pivot)
-pivot_stats = (
-    agg_stats
-    .groupBy("segmento_atividade", "segmento_ticket", "segmento_localizacao")
-    .pivot("is_target", ["target", "control"])
-    .agg(
-        F.first("n").alias("n"),
-        F.first("mean").alias("mean"),
-        F.first("var").alias("var")
-    )
+# 2. Granularidade original (atividade x ticket x localização)
+resultados_final = resultados_cubo[resultados_cubo["nivel"] == nome_nivel(SEGMENTOS)][[
+    "segmento_atividade", "segmento_ticket", "segmento_localizacao",
+    "target_n", "control_n", "target_mean", "control_mean",
+    "diferenca", "ic_inferior", "ic_superior",
+    "t_stat", "gl", "p_valor", "p_valor_ajustado", "status_teste"
+]]
+
+# Exibir resultados
+display(resultados_final)
+
+
+# COMMAND ----------
+
+# Células com teste válido de todos os níveis, das mais significativas para as menos
+display(resultados_cubo.dropna(subset=["p_valor"]).sort_values("p_valor"))
+
+# COMMAND ----------
+
+# DBTITLE 1,Métricas de execução por etapa
+
+# Acrescenta as métricas desta execução à tabela Delta; as etapas mais lentas e os joins marcados
+# com fanout aparecem primeiro
+df_metricas_etapas = gravar_metricas_etapas(spark, metricas_etapas)
+display(df_metricas_etapas.sort_values(["alerta_fanout", "duracao_s"], ascending=False))
+
+# Comparação com as execuções anteriores
+display(
+    spark.read.format("delta").load(CAMINHO_METRICAS_ETAPAS)
+    .groupBy("etapa")
+    .agg(F.count("*").alias("execucoes"),
+         F.avg("duracao_s").alias("duracao_media_s"),
+         F.max("duracao_s").alias("duracao_max_s"),
+         F.avg("shuffle_escrita_bytes").alias("shuffle_escrita_media_bytes"),
+         F.max("spill_disco_bytes").alias("spill_disco_max_bytes"))
+    .orderBy(F.desc("duracao_media_s"))
 )
 
-# 3. Calcular o t-stat e p-valor com UDF
-def calcular_t_p(n1, m1, v1, n2, m2, v2):
-    try:
-        if n1 < 2 or n2 < 2:
-            return None, None
-
-        # Welch's t-test
-        t_stat = (m1 - m2) / math.sqrt((v1 / n1) + (v2 / n2))
-        
-        # Graus de liberdade
-        df = ((v1 / n1 + v2 / n2) ** 2) / (
-            ((v1 / n1) ** 2) / (n1 - 1) + ((v2 / n2) ** 2) / (n2 - 1)
-        )
-
-        p_val = 2 * (1 - t.cdf(abs(t_stat), df))
-        return float(t_stat), float(p_val)
-    except:
-        return None, None
-
-schema = StructType([
-    StructField("t_stat", DoubleType(), True),
-    StructField("p_val", DoubleType(), True)
-])
+# COMMAND ----------
 
-udf_ttest = udf(calcular_t_p, schema)
+# Gasto total por cliente (um valor por cliente) nos níveis de um segmento e de pares de segmentos
+niveis_gasto = [nivel for nivel in niveis_segmentos(SEGMENTOS) if 1 <= len(nivel) <= 2]
+display(cubo_segmentos(df_segmentado, SEGMENTOS, niveis=niveis_gasto, valor="gasto_total"))
 
-# 4. Aplicar o UDF no DataFrame
-resultados_final = pivot_stats.withColumn(
-    "ttest",
-    udf_ttest(
-        F.col("target_n"), F.col("target_mean"), F.col("target_var"),
-        F.col("control_n"), F.col("control_mean"), F.col("control_var")
-    )
-).select(
-    "segmento_atividade", "segmento_ticket", "segmento_localizacao",
-    "target_mean", "control_mean",
-    F.col("ttest.t_stat").alias("t_stat"),
-    F.col("ttest.p_val").alias("p_valor")
+# COMMAND ----------
+
+# DBTITLE 1,Intervalos de confiança por bootstrap (Poisson)
+
+# Uma linha por cliente atribuído ao teste; quem não comprou entra com 0 pedidos e gasto 0
+df_clientes_bootstrap = (
+    df_atividade.select("customer_id", "is_target", "segmento_atividade")
+    .join(df_metricas_clientes.select("customer_id", "n_pedidos", "gasto_total"), "customer_id", "left")
+    .join(dim_segmentos.select("customer_id", "segmento_ticket", "segmento_localizacao"), "customer_id", "left")
 )
 
-# Exibir resultados
-resultados_final.show(truncate=False)
+# Todas as réplicas em um único job; as somas ficam na célula mais fina de segmentos
+somas_bootstrap = bootstrap_poisson(df_clientes_bootstrap, SEGMENTOS, n_replicas=200)
 
+# IC percentil de ticket médio, receita por usuário, conversão e lift: total e por segmento
+display(intervalos_bootstrap(somas_bootstrap))
+display(intervalos_bootstrap(somas_bootstrap, ["segmento_atividade"]))
+display(intervalos_bootstrap(somas_bootstrap, ["segmento_ticket"]))
 
 # COMMAND ----------
 
-resultados_final.filter("p_valor IS NOT NULL").orderBy("p_valor").show()
+# DBTITLE 1,Cenários de viabilidade financeira (grade de premissas)
+
+# Somas por grupo x segmento: um job apenas enquanto agregados, pedidos, ab_test e as definições dos
+# segmentos (plano de df_clientes_bootstrap, com DATA_INICIO_CAMPANHA e limiares) não mudarem
+chave_versoes = versoes_entradas(spark, [CAMINHO_AGREGADO_CLIENTES_DIA], [df_orders, df_ab_test])
+agregados_financeiros = agregados_cenarios(df_clientes_bootstrap, SEGMENTOS, chave_versoes)
+
+# Grade avaliada no driver; valor_cupom=10, margem=0.20, resgate=1 e fração=1 é o cenário da seção 1b
+grade_cenarios = dict(
+    valores_cupom=[5, 10, 15, 20, 30],
+    margens=[0.10, 0.15, 0.20, 0.25, 0.30],
+    taxas_resgate=[0.25, 0.50, 0.75, 1.0],
+    fracoes_incrementais=[0.05, 0.10, 0.25, 0.50, 0.75, 1.0]
+)
+cenarios_total = simular_cenarios(agregados_financeiros, **grade_cenarios)
+cenarios_segmento = simular_cenarios(agregados_financeiros, **grade_cenarios, segmentos=["segmento_atividade", "segmento_ticket"])
+print(f"{len(cenarios_total) + len(cenarios_segmento)} cenários avaliados")
+
+# Valor máximo de cupom que se paga, por margem x fração incremental
+display(superficie_equilibrio(cenarios_total).reset_index())
+display(superficie_equilibrio(cenarios_segmento, segmentos=["segmento_atividade", "segmento_ticket"]).reset_index())
+
+# ROI por segmento nas premissas da seção 1b
+display(cenarios_segmento[
+    (cenarios_segmento["valor_cupom"] == valor_cupom)
+    & (cenarios_segmento["margem"] == margem_lucro_percentual)
+    & (cenarios_segmento["taxa_resgate"] == 1.0)
+    & (cenarios_segmento["fracao_incremental"] == 1.0)
+])
 
 # COMMAND ----------
 
@@ -481,4 +622,28 @@ resultados_final.filter("p_valor IS NOT NULL").orderBy("p_valor").show()
 # MAGIC   
 # MAGIC - **Mensurar tempo de resposta ao cupom**
 # MAGIC   - Acompanhar quanto tempo leva entre o envio do cupom e a realização da compra.
-# MAGIC   - Isso ajuda a entender a janela de impacto da ação e permite definir validade ideal para futuras campanhas.
\ No newline at end of file
+# MAGIC   - Isso ajuda a entender a janela de impacto da ação e permite definir validade ideal para futuras campanhas.
+
+# COMMAND ----------
+
+# DBTITLE 1,Dimensionamento do próximo teste (poder por Monte Carlo)
+
+import time
+
+# Distribuição sem cupom: clientes do control, com o segmento de atividade (conhecido para todos)
+bases_poder = base_simulacao(df_clientes_bootstrap, "segmento_atividade")
+
+# 6 braços tratados (R$10/R$20/R$30 x fixo/percentual) contra o mesmo control
+inicio = time.perf_counter()
+curvas_poder = simular_poder(
+    bases_poder,
+    efeitos=[0.01, 0.02, 0.03, 0.05, 0.075, 0.10, 0.15],
+    tamanhos=[2_500, 5_000, 10_000, 20_000, 40_000],
+    n_simulacoes=10_000,
+    n_comparacoes=6
+)
+print(f"{len(curvas_poder)} desenhos simulados em {time.perf_counter() - inicio:.1f}s")
+
+display(curvas_poder)
+display(efeito_minimo_detectavel(curvas_poder, poder_alvo=0.8))
+display(tamanho_minimo_amostra(curvas_poder, poder_alvo=0.8))
@@ -0,0 +1,85 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Bootstrap de Poisson Distribuído
+# MAGIC
+# MAGIC Os valores de pedido têm cauda pesada, e os testes de Welch supõem médias aproximadamente normais. O bootstrap de Poisson dá a cada cliente um peso `Poisson(1)` por réplica e roda no próprio cluster, sem coletar clientes no driver.
+# MAGIC
+# MAGIC - Cada lote Arrow (`mapInPandas`) gera uma matriz de pesos clientes x réplicas com numpy e devolve, por célula de segmento e réplica, as somas ponderadas de clientes, pedidos, gasto e convertidos. São poucas linhas por lote.
+# MAGIC - Um único `groupBy` soma os parciais de todas as réplicas. A réplica 0 usa peso 1 (amostra observada) e dá a estimativa pontual.
+# MAGIC - As somas ficam na célula mais fina de segmentos e são aditivas, então totais e recortes por segmento saem no driver com as mesmas réplicas.
+# MAGIC - Os intervalos percentis (`intervalos_bootstrap`) são calculados no driver, em `campanha_cupons/estatisticas.py`.
+# MAGIC
+# MAGIC Use com `%run "./case_ifood - bootstrap"`.
+
+# COMMAND ----------
+
+import numpy as np
+import pandas as pd
+import pyspark.sql.functions as F
+from pyspark import TaskContext
+from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType
+
+# Intervalos percentis a partir das somas por réplica (pandas, sem Spark)
+from campanha_cupons.estatisticas import SOMAS_BOOTSTRAP, intervalos_bootstrap
+
+# COMMAND ----------
+
+def _somas_por_replica(chaves, n_replicas, semente):
+    """Função do mapInPandas: somas ponderadas por (célula, réplica) de cada lote."""
+    def _processar(lotes):
+        contexto = TaskContext.get()
+        particao = contexto.partitionId() if contexto else 0
+        for indice_lote, pdf in enumerate(lotes):
+            rng = np.random.default_rng([semente, particao, indice_lote])
+            pesos = np.ones((len(pdf), n_replicas + 1), dtype=np.float32)
+            pesos[:, 1:] = rng.poisson(1.0, size=(len(pdf), n_replicas))
+
+            valores = np.column_stack([
+                np.ones(len(pdf)),
+                pdf["n_pedidos"].to_numpy(dtype=float),
+                pdf["gasto_total"].to_numpy(dtype=float),
+                (pdf["n_pedidos"].to_numpy(dtype=float) > 0).astype(float)
+            ])
+
+            saidas = []
+            for celula, indices in pdf.groupby(chaves).indices.items():
+                celula = celula if isinstance(celula, tuple) else (celula,)
+                # (réplicas x clientes) @ (clientes x métricas) -> (réplicas x métricas)
+                somas = pesos[indices].T.astype(float) @ valores[indices]
+                saida = pd.DataFrame(somas, columns=SOMAS_BOOTSTRAP)
+                saida.insert(0, "replica", np.arange(n_replicas + 1, dtype=np.int32))
+                for i, chave in enumerate(chaves):
+                    saida.insert(i, chave, celula[i])
+                saidas.append(saida)
+            if saidas:
+                yield pd.concat(saidas, ignore_index=True)
+    return _processar
+
+
+def bootstrap_poisson(df_clientes, segmentos, n_replicas=200, semente=42, coluna_grupo="is_target"):
+    """
+    Somas ponderadas por (grupo, segmentos, réplica) para `n_replicas` réplicas de Poisson.
+
+    `df_clientes`: uma linha por cliente atribuído ao teste, com `coluna_grupo`, `segmentos`,
+    `n_pedidos` e `gasto_total` (0 para quem não comprou). Retorna um pandas DataFrame pequeno.
+    """
+    chaves = [coluna_grupo, *segmentos]
+    schema = StructType(
+        [StructField(c, StringType(), True) for c in chaves]
+        + [StructField("replica", IntegerType(), False)]
+        + [StructField(c, DoubleType(), False) for c in SOMAS_BOOTSTRAP]
+    )
+    return (
+        df_clientes
+        .select(
+            F.col(coluna_grupo).cast("string"),
+            # Clientes sem pedido não têm segmento de ticket/localização: ficam em uma célula própria
+            *[F.coalesce(F.col(c).cast("string"), F.lit("Sem segmento")).alias(c) for c in segmentos],
+            F.coalesce(F.col("n_pedidos"), F.lit(0)).cast("double").alias("n_pedidos"),
+            F.coalesce(F.col("gasto_total"), F.lit(0.0)).cast("double").alias("gasto_total")
+        )
+        .mapInPandas(_somas_por_replica(chaves, n_replicas, semente), schema)
+        .groupBy(*chaves, "replica")
+        .agg(*[F.sum(c).alias(c) for c in SOMAS_BOOTSTRAP])
+        .toPandas()
+    )
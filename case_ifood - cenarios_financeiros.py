@@ -0,0 +1,141 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Cenários de Viabilidade Financeira
+# MAGIC
+# MAGIC Generaliza a viabilidade da seção 1b (um cenário fixo) para uma grade de premissas: valor do cupom, margem, taxa de resgate, fração incremental do gasto e segmento.
+# MAGIC
+# MAGIC - Os únicos números que vêm do cluster são somas por segmento x grupo (clientes, convertidos, pedidos, receita). Elas ficam em cache na sessão, com chave nas versões das tabelas de entrada e no plano lógico de `df_clientes` (que contém as definições dos segmentos e a `DATA_INICIO_CAMPANHA`): enquanto as tabelas e as definições não mudam, novas grades não disparam jobs.
+# MAGIC - A grade é avaliada com arrays numpy (broadcast de todos os eixos de uma vez). Milhares de cenários saem em milissegundos.
+# MAGIC - `fracao_incremental = 1` e `taxa_resgate = 1` reproduzem as premissas da seção 1b: um cupom por pedido do target e todo o gasto do pedido (ticket do control) tratado como adicional. `fracao_incremental_observada` é a fração implícita na diferença de receita por cliente entre os grupos, uma referência para a grade.
+# MAGIC - Como custo e lucro são proporcionais ao nº de cupons, o ponto de equilíbrio não depende da taxa de resgate: `valor_cupom_equilibrio = ticket do control x fração incremental x margem`.
+# MAGIC
+# MAGIC Use com `%run "./case_ifood - cenarios_financeiros"`.
+
+# COMMAND ----------
+
+import hashlib
+
+from delta.tables import DeltaTable
+import numpy as np
+import pyspark.sql.functions as F
+
+_SOMAS_CENARIOS = ["clientes", "clientes_convertidos", "pedidos", "receita"]
+
+# Agregados já calculados na sessão, por (versões das entradas, plano de df_clientes, segmentos, coluna de grupo)
+_CACHE_AGREGADOS = {}
+
+# COMMAND ----------
+
+def versoes_entradas(spark, caminhos_delta=(), dfs_arquivos=()):
+    """
+    Identificador das versões de entrada: versão atual de cada tabela Delta e, para DataFrames
+    lidos de arquivos (Parquet), um hash da lista de arquivos (uma regravação gera arquivos novos).
+    """
+    versoes = [f"{caminho}@{DeltaTable.forPath(spark, caminho).history(1).first()['version']}" for caminho in caminhos_delta]
+    versoes += [hashlib.sha1("\n".join(sorted(df.inputFiles())).encode()).hexdigest() for df in dfs_arquivos]
+    return tuple(versoes)
+
+
+def agregados_cenarios(df_clientes, segmentos, chave_versoes, coluna_grupo="is_target"):
+    """
+    Somas por (grupo, segmentos) usadas pelos cenários, calculadas no Spark apenas na primeira chamada
+    para cada `chave_versoes` (saída de `versoes_entradas`) e plano de `df_clientes`.
+
+    O hash semântico do plano muda com qualquer literal da definição (limiares de ticket, janela de
+    atividade, `DATA_INICIO_CAMPANHA`), então mudar um segmento não reaproveita somas antigas.
+
+    `df_clientes`: uma linha por cliente atribuído ao teste, com `n_pedidos` e `gasto_total`
+    (nulos para quem não comprou).
+    """
+    segmentos = list(segmentos)
+    chave = (chave_versoes, df_clientes.semanticHash(), tuple(segmentos), coluna_grupo)
+    if chave not in _CACHE_AGREGADOS:
+        _CACHE_AGREGADOS[chave] = (
+            df_clientes
+            .select(
+                F.col(coluna_grupo).cast("string").alias(coluna_grupo),
+                *[F.coalesce(F.col(c).cast("string"), F.lit("Sem segmento")).alias(c) for c in segmentos],
+                F.coalesce(F.col("n_pedidos"), F.lit(0)).alias("n_pedidos"),
+                F.coalesce(F.col("gasto_total"), F.lit(0.0)).alias("gasto_total")
+            )
+            .groupBy(coluna_grupo, *segmentos)
+            .agg(
+                F.count(F.lit(1)).alias("clientes"),
+                F.sum((F.col("n_pedidos") > 0).cast("long")).alias("clientes_convertidos"),
+                F.sum("n_pedidos").alias("pedidos"),
+                F.sum("gasto_total").alias("receita")
+            )
+            .toPandas()
+        )
+    return _CACHE_AGREGADOS[chave]
+
+# COMMAND ----------
+
+def simular_cenarios(agregados, valores_cupom, margens, taxas_resgate=(1.0,), fracoes_incrementais=(1.0,),
+                     segmentos=(), coluna_grupo="is_target", grupo_1="target", grupo_2="control"):
+    """
+    Resultado financeiro de todas as combinações segmento x valor do cupom x margem x taxa de resgate
+    x fração incremental. `segmentos` é um subconjunto dos segmentos de `agregados` (vazio = total,
+    na coluna `segmento`). Retorna um pandas DataFrame com uma linha por cenário.
+    """
+    chaves = list(segmentos) or ["segmento"]
+    base = agregados if segmentos else agregados.assign(segmento="Total")
+    celulas = (
+        base.groupby([*chaves, coluna_grupo])[_SOMAS_CENARIOS].sum()
+        .unstack(coluna_grupo)
+        .fillna(0)
+    )
+
+    pedidos_alvo = celulas[("pedidos", grupo_1)].to_numpy(dtype=float)
+    clientes_alvo = celulas[("clientes", grupo_1)].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ticket_controle = (celulas[("receita", grupo_2)] / celulas[("pedidos", grupo_2)]).to_numpy(dtype=float)
+        receita_cliente_alvo = celulas[("receita", grupo_1)].to_numpy(dtype=float) / clientes_alvo
+        receita_cliente_controle = (celulas[("receita", grupo_2)] / celulas[("clientes", grupo_2)]).to_numpy(dtype=float)
+        fracao_observada = (receita_cliente_alvo - receita_cliente_controle) * clientes_alvo / (pedidos_alvo * ticket_controle)
+
+    # Todos os eixos da grade em broadcast, achatados em uma linha por cenário
+    grade = np.meshgrid(
+        np.arange(len(celulas)),
+        np.asarray(valores_cupom, dtype=float),
+        np.asarray(margens, dtype=float),
+        np.asarray(taxas_resgate, dtype=float),
+        np.asarray(fracoes_incrementais, dtype=float),
+        indexing="ij"
+    )
+    celula, valor_cupom, margem, taxa_resgate, fracao = (eixo.ravel() for eixo in grade)
+
+    cupons_usados = taxa_resgate * pedidos_alvo[celula]
+    transacional_estimado = cupons_usados * ticket_controle[celula] * fracao
+    custo_campanha = cupons_usados * valor_cupom
+    lucro_adicional = transacional_estimado * margem
+    resultado_liquido = lucro_adicional - custo_campanha
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roi = resultado_liquido / custo_campanha
+        fracao_equilibrio = valor_cupom / (ticket_controle[celula] * margem)
+
+    cenarios = celulas.index.to_frame(index=False).iloc[celula].reset_index(drop=True)
+    return cenarios.assign(
+        valor_cupom=valor_cupom,
+        margem=margem,
+        taxa_resgate=taxa_resgate,
+        fracao_incremental=fracao,
+        ticket_medio_controle=ticket_controle[celula],
+        fracao_incremental_observada=fracao_observada[celula],
+        cupons_usados=cupons_usados,
+        transacional_estimado=transacional_estimado,
+        custo_campanha=custo_campanha,
+        lucro_adicional=lucro_adicional,
+        resultado_liquido=resultado_liquido,
+        roi=roi,
+        viavel=lucro_adicional > custo_campanha,
+        valor_cupom_equilibrio=ticket_controle[celula] * fracao * margem,
+        fracao_incremental_equilibrio=fracao_equilibrio
+    )
+
+
+def superficie_equilibrio(cenarios, linhas="margem", colunas="fracao_incremental",
+                          valor="valor_cupom_equilibrio", segmentos=()):
+    """Superfície de equilíbrio (`valor` por `linhas` x `colunas`) de cada segmento, a partir de `simular_cenarios`."""
+    chaves = list(segmentos) or ["segmento"]
+    return cenarios.pivot_table(index=[*chaves, linhas], columns=colunas, values=valor, aggfunc="first")
@@ -0,0 +1,82 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Métricas de Cesta a partir dos Itens
+# MAGIC
+# MAGIC Métricas por pedido e por cliente calculadas sobre `items` (array tipado gravado na ingestão): quantidade de itens, itens distintos, valor bruto (preço unitário x quantidade), valor cobrado, descontos e adicionais.
+# MAGIC
+# MAGIC - Cada pedido é resumido dentro do próprio array com funções de ordem superior (`aggregate`, `transform`, `filter`), sem `explode`: o número de linhas continua sendo o de pedidos e só as colunas resumidas seguem para a agregação por cliente.
+# MAGIC - As métricas de cada pedido entram nos agregados diários (`case_ifood - agregados_diarios`) como somas por cliente x dia, então o array de itens só é lido nos dias reprocessados; `metricas_itens_clientes` soma essas colunas.
+# MAGIC
+# MAGIC Use com `%run "./case_ifood - cesta_itens"`.
+
+# COMMAND ----------
+
+import pyspark.sql.functions as F
+
+# COMMAND ----------
+
+def _somar_itens(items, valor):
+    """Soma de `valor(item)` sobre o array, tratando nulos como 0."""
+    return F.aggregate(items, F.lit(0.0), lambda acumulado, x: acumulado + F.coalesce(valor(x), F.lit(0.0)))
+
+
+def _contar_itens(items, coluna_array):
+    """Tamanho do array derivado de `items`; 0 quando `items` é nulo (size(null) seria -1)."""
+    return F.when(items.isNotNull(), F.size(coluna_array)).otherwise(F.lit(0))
+
+
+METRICAS_ITENS = ["n_itens", "n_itens_distintos", "valor_bruto_itens", "valor_cobrado_itens",
+                  "desconto_itens", "adicional_itens", "n_itens_com_desconto"]
+
+
+def colunas_itens_pedido():
+    """Métricas da cesta de um pedido (`METRICAS_ITENS`, com alias); pedidos sem itens ficam com 0."""
+    items = F.col("items")
+    return [
+        *[
+            F.coalesce(expressao, F.lit(0.0)).alias(nome)
+            for nome, expressao in [
+                ("n_itens", _somar_itens(items, lambda x: x["quantity"])),
+                ("valor_bruto_itens", _somar_itens(items, lambda x: x["quantity"] * x["unit_price"])),
+                ("valor_cobrado_itens", _somar_itens(items, lambda x: x["total_value"])),
+                ("desconto_itens", _somar_itens(items, lambda x: x["total_discount"])),
+                ("adicional_itens", _somar_itens(items, lambda x: x["total_addition"]))
+            ]
+        ],
+        _contar_itens(
+            items, F.array_distinct(F.transform(items, lambda x: F.coalesce(x["external_id"], x["name"])))
+        ).alias("n_itens_distintos"),
+        _contar_itens(
+            items, F.filter(items, lambda x: F.coalesce(x["total_discount"], F.lit(0.0)) > 0)
+        ).alias("n_itens_com_desconto")
+    ]
+
+
+def metricas_itens_pedido(df_orders):
+    """Uma linha por pedido com as métricas da cesta."""
+    return df_orders.select("customer_id", "order_id", *colunas_itens_pedido())
+
+
+def agregacoes_itens():
+    """Somas das métricas de cesta e nº de pedidos com itens, sobre linhas com `METRICAS_ITENS`."""
+    return [
+        F.count(F.when(F.col("n_itens") > 0, 1)).alias("pedidos_com_itens"),
+        *[F.sum(c).alias(c) for c in METRICAS_ITENS]
+    ]
+
+
+def metricas_itens_clientes(df_agregado):
+    """
+    Métricas de cesta por cliente a partir dos agregados diários: totais somados dos pedidos, médias por
+    pedido com itens (`itens_por_pedido`, `itens_distintos_por_pedido`) e `percentual_desconto`
+    (desconto / valor bruto).
+    """
+    return (
+        df_agregado
+        .groupBy("customer_id")
+        .agg(*[F.sum(c).alias(c) for c in ["pedidos_com_itens", *METRICAS_ITENS]])
+        .withColumn("itens_por_pedido", F.col("n_itens") / F.col("pedidos_com_itens"))
+        .withColumn("itens_distintos_por_pedido", F.col("n_itens_distintos") / F.col("pedidos_com_itens"))
+        .withColumn("percentual_desconto",
+                    F.when(F.col("valor_bruto_itens") > 0, F.col("desconto_itens") / F.col("valor_bruto_itens")))
+    )
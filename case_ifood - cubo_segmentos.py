@@ -0,0 +1,50 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Cubo de Segmentos
+# MAGIC
+# MAGIC Calcula n, média e variância de todas as combinações de segmentos pedidas em uma única passada `GROUPING SETS` sobre a base por cliente, com target/control lado a lado por agregação condicional, e roda o teste de Welch em cada célula.
+# MAGIC O resultado é uma única tabela com a coluna `nivel` (ex.: `segmento_ticket`, `segmento_atividade x segmento_localizacao`, `geral`) para filtrar a granularidade desejada.
+# MAGIC
+# MAGIC A consulta e os testes são os de `campanha_cupons.pipeline.cubo_segmentos`, executados no Spark por `BackendSpark`; este notebook só prepara a base Spark.
+# MAGIC
+# MAGIC Use com `%run "./case_ifood - cubo_segmentos"`.
+
+# COMMAND ----------
+
+import uuid
+
+import pyspark.sql.functions as F
+
+from campanha_cupons.backends import BackendSpark
+from campanha_cupons.pipeline import cubo_segmentos as _cubo_segmentos_sql, niveis_segmentos, nome_nivel
+
+# COMMAND ----------
+
+def cubo_segmentos(df, segmentos, niveis=None, valor=None, n="n", soma="soma", soma_q="soma_q",
+                   coluna_grupo="is_target", grupo_1="target", grupo_2="control", alpha=0.05):
+    """
+    Teste de Welch (grupo_1 vs grupo_2) para cada célula de cada nível de segmentação.
+
+    A métrica vem de estatísticas suficientes já somáveis em `df` (colunas `n`, `soma`, `soma_q`,
+    ex.: pedidos, gasto e gasto² de cada cliente) ou, com `valor`, de uma coluna com um valor por linha.
+    `niveis` é uma lista de tuplas de segmentos; por padrão, todas as combinações de `segmentos`.
+    Retorna um pandas DataFrame com uma linha por (nivel, célula).
+    """
+    if valor is not None:
+        df = df.select(
+            *segmentos, coluna_grupo,
+            F.when(F.col(valor).isNotNull(), 1).otherwise(0).alias("n"),
+            F.col(valor).cast("double").alias("soma"),
+            (F.col(valor).cast("double") * F.col(valor).cast("double")).alias("soma_q")
+        )
+        n, soma, soma_q = "n", "soma", "soma_q"
+
+    visao = f"cubo_segmentos_{uuid.uuid4().hex}"
+    df.createOrReplaceTempView(visao)
+    try:
+        return _cubo_segmentos_sql(
+            BackendSpark(spark), segmentos, niveis=niveis, tabela=visao, filtro=None,
+            n=n, soma=soma, soma_q=soma_q, coluna_grupo=coluna_grupo, grupo_1=grupo_1, grupo_2=grupo_2, alpha=alpha
+        )
+    finally:
+        spark.catalog.dropTempView(visao)
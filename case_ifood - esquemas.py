@@ -0,0 +1,196 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Esquemas e Caminhos das Bases
+# MAGIC
+# MAGIC Definições compartilhadas entre a ingestão e a análise. Use com `%run "./case_ifood - esquemas"`.
+
+# COMMAND ----------
+
+from pyspark.sql.types import (
+    StructType, StructField, StringType, DoubleType, IntegerType,
+    BooleanType, TimestampType, ArrayType
+)
+import pyspark.sql.functions as F
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC #### Caminhos
+
+# COMMAND ----------
+
+# Arquivos brutos (download do S3, ab_test_ref.tar.gz já extraído)
+CAMINHO_RAW = 'dbfs:/FileStore/case_ifood/raw'
+CAMINHO_RAW_ORDERS = f'{CAMINHO_RAW}/order.json.gz'
+CAMINHO_RAW_CONSUMERS = f'{CAMINHO_RAW}/consumer.csv.gz'
+CAMINHO_RAW_MERCHANTS = f'{CAMINHO_RAW}/restaurant.csv.gz'
+CAMINHO_RAW_AB_TEST = f'{CAMINHO_RAW}/ab_test_ref.csv'
+
+# Bases tipadas em Parquet (saída da ingestão, entrada da análise)
+CAMINHO_PARQUET = 'dbfs:/FileStore/case_ifood/parquet'
+CAMINHO_PARQUET_ORDERS = f'{CAMINHO_PARQUET}/orders'
+CAMINHO_PARQUET_CONSUMERS = f'{CAMINHO_PARQUET}/consumers'
+CAMINHO_PARQUET_MERCHANTS = f'{CAMINHO_PARQUET}/merchants'
+CAMINHO_PARQUET_AB_TEST = f'{CAMINHO_PARQUET}/ab_test_ref'
+
+# Camada agregada (Delta), atualizada incrementalmente pela análise
+CAMINHO_AGREGADOS = 'dbfs:/FileStore/case_ifood/agregados'
+CAMINHO_AGREGADO_CLIENTES_DIA = f'{CAMINHO_AGREGADOS}/clientes_dia'
+CAMINHO_SKETCHES_CLIENTES_DIA = f'{CAMINHO_AGREGADOS}/sketches_clientes_dia'
+
+# Monitor em streaming: novos arquivos de pedidos, checkpoint e resultados publicados (Delta)
+CAMINHO_STREAMING = 'dbfs:/FileStore/case_ifood/streaming'
+CAMINHO_STREAMING_ENTRADA = f'{CAMINHO_STREAMING}/orders_novos'
+CAMINHO_STREAMING_CHECKPOINT = f'{CAMINHO_STREAMING}/checkpoint'
+CAMINHO_STREAMING_MONITOR = f'{CAMINHO_STREAMING}/monitor_teste_ab'
+
+# Métricas de execução por etapa do pipeline (Delta, só acréscimos)
+CAMINHO_METRICAS_ETAPAS = 'dbfs:/FileStore/case_ifood/metricas/etapas'
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC #### Esquemas
+# MAGIC
+# MAGIC Os arquivos brutos são lidos como texto e convertidos para os tipos abaixo com `aplicar_esquema`, pelo nome da coluna (e não pela posição no arquivo).
+# MAGIC Os valores monetários dentro de `items` vêm como objetos `{value, currency}` e são achatados para `double`.
+
+# COMMAND ----------
+
+schema_orders = StructType([
+    StructField("cpf", StringType(), True),
+    StructField("customer_id", StringType(), True),
+    StructField("customer_name", StringType(), True),
+    StructField("delivery_address_city", StringType(), True),
+    StructField("delivery_address_country", StringType(), True),
+    StructField("delivery_address_district", StringType(), True),
+    StructField("delivery_address_external_id", StringType(), True),
+    StructField("delivery_address_latitude", DoubleType(), True),
+    StructField("delivery_address_longitude", DoubleType(), True),
+    StructField("delivery_address_state", StringType(), True),
+    StructField("delivery_address_zip_code", StringType(), True),
+    StructField("items", StringType(), True),
+    StructField("merchant_id", StringType(), True),
+    StructField("merchant_latitude", DoubleType(), True),
+    StructField("merchant_longitude", DoubleType(), True),
+    StructField("merchant_timezone", StringType(), True),
+    StructField("order_created_at", TimestampType(), True),
+    StructField("order_id", StringType(), True),
+    StructField("order_scheduled", BooleanType(), True),
+    StructField("order_total_amount", DoubleType(), True),
+    StructField("origin_platform", StringType(), True),
+    StructField("order_scheduled_date", TimestampType(), True)
+])
+
+schema_consumers = StructType([
+    StructField("customer_id", StringType(), True),
+    StructField("language", StringType(), True),
+    StructField("created_at", TimestampType(), True),
+    StructField("active", BooleanType(), True),
+    StructField("customer_name", StringType(), True),
+    StructField("customer_phone_area", StringType(), True),
+    StructField("customer_phone_number", StringType(), True)
+])
+
+schema_merchants = StructType([
+    StructField("id", StringType(), True),
+    StructField("created_at", TimestampType(), True),
+    StructField("enabled", BooleanType(), True),
+    StructField("price_range", IntegerType(), True),
+    StructField("average_ticket", DoubleType(), True),
+    StructField("delivery_time", DoubleType(), True),
+    StructField("minimum_order_value", DoubleType(), True),
+    StructField("merchant_zip_code", StringType(), True),
+    StructField("merchant_city", StringType(), True),
+    StructField("merchant_state", StringType(), True),
+    StructField("merchant_country", StringType(), True)
+])
+
+schema_ab_test = StructType([
+    StructField("customer_id", StringType(), True),
+    StructField("is_target", StringType(), True)
+])
+
+# Itens do pedido, como aparecem no JSON (valores monetários como {value, currency})
+_schema_valor_raw = StructType([
+    StructField("value", StringType(), True),
+    StructField("currency", StringType(), True)
+])
+
+_campos_item_raw = [
+    StructField("name", StringType(), True),
+    StructField("externalId", StringType(), True),
+    StructField("quantity", StringType(), True),
+    StructField("unitPrice", _schema_valor_raw, True),
+    StructField("totalValue", _schema_valor_raw, True),
+    StructField("discount", _schema_valor_raw, True),
+    StructField("addition", _schema_valor_raw, True)
+]
+
+schema_items_raw = ArrayType(StructType(
+    _campos_item_raw + [
+        StructField("totalDiscount", _schema_valor_raw, True),
+        StructField("totalAddition", _schema_valor_raw, True),
+        StructField("garnishItems", ArrayType(StructType(_campos_item_raw)), True)
+    ]
+))
+
+# Itens do pedido já tipados (o que fica gravado no Parquet)
+_campos_item = [
+    StructField("name", StringType(), True),
+    StructField("external_id", StringType(), True),
+    StructField("quantity", DoubleType(), True),
+    StructField("unit_price", DoubleType(), True),
+    StructField("total_value", DoubleType(), True),
+    StructField("discount", DoubleType(), True),
+    StructField("addition", DoubleType(), True)
+]
+
+schema_items = ArrayType(StructType(
+    _campos_item + [
+        StructField("total_discount", DoubleType(), True),
+        StructField("total_addition", DoubleType(), True),
+        StructField("garnish_items", ArrayType(StructType(_campos_item)), True)
+    ]
+))
+
+# COMMAND ----------
+
+def esquema_texto(schema):
+    """Mesmo esquema com todas as colunas como string (leitura bruta, sem descartar valores)."""
+    return StructType([StructField(campo.name, StringType(), True) for campo in schema.fields])
+
+
+def aplicar_esquema(df, schema):
+    """Seleciona as colunas do esquema por nome e converte cada uma para o tipo declarado."""
+    return df.select([
+        F.col(campo.name).cast(campo.dataType).alias(campo.name)
+        if campo.name in df.columns
+        else F.lit(None).cast(campo.dataType).alias(campo.name)
+        for campo in schema.fields
+    ])
+
+
+def _campos_item_tipados(x):
+    return [
+        x["name"].alias("name"),
+        x["externalId"].alias("external_id"),
+        x["quantity"].cast("double").alias("quantity"),
+        x["unitPrice"]["value"].cast("double").alias("unit_price"),
+        x["totalValue"]["value"].cast("double").alias("total_value"),
+        x["discount"]["value"].cast("double").alias("discount"),
+        x["addition"]["value"].cast("double").alias("addition")
+    ]
+
+
+def parsear_items(coluna_json):
+    """Converte a string JSON de `items` em array<struct> tipado (schema_items)."""
+    return F.transform(
+        F.from_json(coluna_json, schema_items_raw),
+        lambda x: F.struct(
+            *_campos_item_tipados(x),
+            x["totalDiscount"]["value"].cast("double").alias("total_discount"),
+            x["totalAddition"]["value"].cast("double").alias("total_addition"),
+            F.transform(x["garnishItems"], lambda g: F.struct(*_campos_item_tipados(g))).alias("garnish_items")
+        )
+    )
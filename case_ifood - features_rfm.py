@@ -0,0 +1,62 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Features de Recência e Frequência Pré-Campanha
+# MAGIC
+# MAGIC Uma linha por cliente com recência, frequência, gasto e intervalos entre pedidos no período anterior ao início da campanha.
+# MAGIC Os intervalos saem de `lag` sobre uma janela por `customer_id` ordenada por `order_created_at`; a agregação seguinte reaproveita o mesmo particionamento, então há uma única ordenação e nenhum self-join.
+# MAGIC O segmento de atividade usa a regra de `campanha_cupons/segmentos.py`, a mesma do pipeline SQL.
+# MAGIC
+# MAGIC Use com `%run "./case_ifood - features_rfm"`.
+
+# COMMAND ----------
+
+import pyspark.sql.functions as F
+from pyspark.sql.window import Window
+
+from campanha_cupons.segmentos import JANELA_ATIVO_DIAS, expressao_segmento_atividade
+
+# COMMAND ----------
+
+def features_rfm(df_orders, data_inicio_campanha, janela_ativo_dias=JANELA_ATIVO_DIAS):
+    """
+    Features por cliente com os pedidos anteriores a `data_inicio_campanha`:
+    - dias_desde_ultimo_pedido: recência em relação ao início da campanha;
+    - frequencia_pre e gasto_pre: nº de pedidos e valor total no período;
+    - intervalo_medio_dias e intervalo_max_dias: intervalos entre pedidos consecutivos;
+    - segmento_atividade e ativo_pre: pediu nos `janela_ativo_dias` dias anteriores à campanha.
+    """
+    inicio = F.to_timestamp(F.lit(data_inicio_campanha))
+    janela = Window.partitionBy("customer_id").orderBy("order_created_at")
+
+    return (
+        df_orders
+        # Filtro em order_date poda as partições do Parquet
+        .filter((F.col("order_date") < F.to_date(inicio)) & (F.col("order_created_at") < inicio))
+        .select("customer_id", "order_created_at", "order_total_amount")
+        .withColumn(
+            "intervalo_dias",
+            (F.col("order_created_at").cast("long") - F.lag("order_created_at").over(janela).cast("long")) / 86400
+        )
+        .groupBy("customer_id")
+        .agg(
+            F.max("order_created_at").alias("ultimo_pedido_pre"),
+            F.count(F.lit(1)).alias("frequencia_pre"),
+            F.sum("order_total_amount").alias("gasto_pre"),
+            F.avg("intervalo_dias").alias("intervalo_medio_dias"),
+            F.max("intervalo_dias").alias("intervalo_max_dias")
+        )
+        .withColumn("dias_desde_ultimo_pedido", F.datediff(inicio, F.col("ultimo_pedido_pre")))
+        .withColumn("segmento_atividade", F.expr(
+            expressao_segmento_atividade("ultimo_pedido_pre", data_inicio_campanha, janela_ativo_dias)
+        ))
+        .withColumn("ativo_pre", F.col("segmento_atividade") == "Ativo")
+    )
+
+
+def completar_features_rfm(df_clientes, df_rfm):
+    """Junta as features aos clientes; quem não pediu antes da campanha fica com frequência/gasto 0 e inativo."""
+    return (
+        df_clientes
+        .join(df_rfm, "customer_id", "left")
+        .fillna({"frequencia_pre": 0, "gasto_pre": 0.0, "ativo_pre": False, "segmento_atividade": "Inativo"})
+    )
@@ -0,0 +1,80 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Funções Estatísticas
+# MAGIC
+# MAGIC Testes vetorizados sobre estatísticas suficientes `(n, média, variância)`: cada chamada testa todas as linhas (segmentos) de uma vez com numpy/scipy, sem UDF linha a linha.
+# MAGIC Os testes em si (Welch, Benjamini-Hochberg, mSPRT, z de proporções) estão em `campanha_cupons/estatisticas.py`, que não depende de Spark; este notebook os reexporta e acrescenta as agregações no Spark.
+# MAGIC Use com `%run "./case_ifood - funcoes_estatisticas"`.
+
+# COMMAND ----------
+
+import numpy as np
+import pyspark.sql.functions as F
+
+# Funções numpy/scipy (sem Spark) ficam no pacote campanha_cupons, compartilhadas com o backend local
+from campanha_cupons.estatisticas import (
+    welch_vetorizado,
+    benjamini_hochberg,
+    testar_pivot,
+    media_variancia,
+    msprt_vetorizado,
+    ztest_proporcoes_vetorizado
+)
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC #### Estatísticas suficientes calculadas no Spark
+# MAGIC
+# MAGIC Contagem, soma e soma dos quadrados por grupo bastam para média e variância. Elas são somáveis (entre partições, dias ou segmentos), então só algumas linhas chegam ao driver, independentemente do número de clientes.
+
+# COMMAND ----------
+
+def agregacoes_suficientes(coluna, prefixo=None):
+    """Expressões de agregação (n, soma, soma_q) de `coluna`, nulos ignorados."""
+    prefixo = prefixo or coluna
+    valor = F.col(coluna).cast("double")
+    return [
+        F.count(valor).alias(f"{prefixo}_n"),
+        F.sum(valor).alias(f"{prefixo}_soma"),
+        F.sum(valor * valor).alias(f"{prefixo}_soma_q")
+    ]
+
+
+def teste_welch_spark(df, colunas, coluna_grupo="is_target", grupo_1="target", grupo_2="control", alpha=0.05):
+    """
+    Teste de Welch (grupo_1 vs grupo_2) para cada coluna em `colunas`, com uma única agregação no Spark.
+
+    Apenas duas linhas (uma por grupo) são coletadas; o resultado equivale a
+    `scipy.stats.ttest_ind(..., equal_var=False)` sobre os valores não nulos.
+    """
+    agregacoes = [expr for coluna in colunas for expr in agregacoes_suficientes(coluna)]
+    linhas = {
+        linha[coluna_grupo]: linha
+        for linha in (
+            df.filter(F.col(coluna_grupo).isin(grupo_1, grupo_2))
+            .groupBy(coluna_grupo)
+            .agg(*agregacoes)
+            .collect()
+        )
+    }
+
+    def _estatisticas(grupo):
+        linha = linhas.get(grupo)
+        somas = {
+            sufixo: [linha[f"{c}_{sufixo}"] if linha is not None else None for c in colunas]
+            for sufixo in ("n", "soma", "soma_q")
+        }
+        media, variancia = media_variancia(somas["n"], somas["soma"], somas["soma_q"])
+        return np.asarray(somas["n"], dtype=float), media, variancia
+
+    n1, m1, v1 = _estatisticas(grupo_1)
+    n2, m2, v2 = _estatisticas(grupo_2)
+
+    resultado = welch_vetorizado(n1, m1, v1, n2, m2, v2, alpha=alpha)
+    resultado.insert(0, "metrica", list(colunas))
+    resultado.insert(1, f"{grupo_1}_n", n1)
+    resultado.insert(2, f"{grupo_2}_n", n2)
+    resultado.insert(3, f"{grupo_1}_mean", m1)
+    resultado.insert(4, f"{grupo_2}_mean", m2)
+    return resultado
@@ -0,0 +1,64 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Ingestão das Bases Brutas
+# MAGIC
+# MAGIC Converte os arquivos baixados do S3 (README, Etapa 1) em Parquet tipado, que é a entrada do notebook de análise.
+# MAGIC
+# MAGIC - `order.json.gz` é um único gzip, que não é divisível: a leitura inicial roda em um só core. Logo após a leitura os pedidos são redistribuídos por data, e o parse de `items` e as conversões de tipo já rodam em paralelo.
+# MAGIC - `items` é gravado como `array<struct>` tipado e `order_created_at` como `timestamp`.
+# MAGIC - Os pedidos são particionados por `order_date`, permitindo poda de partições e de colunas nas consultas da análise.
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - esquemas"
+
+# COMMAND ----------
+
+import pyspark.sql.functions as F
+
+COMPRESSAO_PARQUET = 'zstd'
+
+# COMMAND ----------
+
+def ingerir_orders(caminho_raw, caminho_saida):
+    df_raw = spark.read.schema(esquema_texto(schema_orders)).json(caminho_raw)
+
+    df_orders = (
+        aplicar_esquema(df_raw, schema_orders)
+        .withColumn("order_date", F.to_date("order_created_at"))
+        # Única redistribuição: paraleliza o parse abaixo e gera um arquivo por data
+        .repartition("order_date")
+        .withColumn("items", parsear_items(F.col("items")))
+    )
+
+    (
+        df_orders.write
+        .mode("overwrite")
+        .option("compression", COMPRESSAO_PARQUET)
+        .partitionBy("order_date")
+        .parquet(caminho_saida)
+    )
+
+
+def ingerir_csv(caminho_raw, schema, caminho_saida):
+    df_raw = spark.read.option("header", True).csv(caminho_raw)
+
+    (
+        aplicar_esquema(df_raw, schema)
+        .write
+        .mode("overwrite")
+        .option("compression", COMPRESSAO_PARQUET)
+        .parquet(caminho_saida)
+    )
+
+# COMMAND ----------
+
+ingerir_orders(CAMINHO_RAW_ORDERS, CAMINHO_PARQUET_ORDERS)
+ingerir_csv(CAMINHO_RAW_CONSUMERS, schema_consumers, CAMINHO_PARQUET_CONSUMERS)
+ingerir_csv(CAMINHO_RAW_MERCHANTS, schema_merchants, CAMINHO_PARQUET_MERCHANTS)
+ingerir_csv(CAMINHO_RAW_AB_TEST, schema_ab_test, CAMINHO_PARQUET_AB_TEST)
+
+# COMMAND ----------
+
+# Conferência rápida dos tipos gravados
+spark.read.parquet(CAMINHO_PARQUET_ORDERS).printSchema()
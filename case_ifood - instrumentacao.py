@@ -0,0 +1,215 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Instrumentação das Etapas do Pipeline
+# MAGIC
+# MAGIC Cada etapa nomeada roda em um job group próprio; ao final, as métricas dos jobs do grupo são lidas da API REST da Spark UI e acumuladas em uma tabela Delta, para comparar execuções e achar a etapa lenta sem abrir a Spark UI.
+# MAGIC
+# MAGIC - `job_group`: executa um bloco em um job group próprio e mede o tempo de parede; `estagios_do_grupo` lista os estágios executados nele. Usados também por `medir_tarefas` (`case_ifood - localizacao`).
+# MAGIC - `medir_etapa`: tempo de parede, jobs e estágios, bytes de shuffle (leitura/escrita), spill (memória/disco), linhas lidas pelas fontes da consulta e, para cada join do plano executado, linhas de entrada e de saída. Joins cuja razão saída/entrada passa de `limiar_fanout` são marcados.
+# MAGIC - `gravar_metricas_etapas`: acrescenta as métricas de uma execução em `CAMINHO_METRICAS_ETAPAS`.
+# MAGIC
+# MAGIC Depende de `case_ifood - esquemas` (carregue-o antes com `%run`).
+
+# COMMAND ----------
+
+import json
+import re
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+from pyspark.sql.types import LongType
+
+# COMMAND ----------
+
+schema_metricas_etapas = StructType([
+    StructField("execucao_id", StringType()),
+    StructField("executado_em", TimestampType()),
+    StructField("etapa", StringType()),
+    StructField("duracao_s", DoubleType()),
+    StructField("job_ids", ArrayType(IntegerType())),
+    StructField("stage_ids", ArrayType(IntegerType())),
+    StructField("tarefas", LongType()),
+    StructField("shuffle_leitura_bytes", LongType()),
+    StructField("shuffle_escrita_bytes", LongType()),
+    StructField("spill_memoria_bytes", LongType()),
+    StructField("spill_disco_bytes", LongType()),
+    StructField("linhas_entrada", LongType()),
+    StructField("linhas_saida", LongType()),
+    StructField("joins", ArrayType(StructType([
+        StructField("operador", StringType()),
+        StructField("linhas_entrada", LongType()),
+        StructField("linhas_saida", LongType()),
+        StructField("razao", DoubleType())
+    ]))),
+    StructField("alerta_fanout", BooleanType())
+])
+
+# COMMAND ----------
+
+def _api_spark_ui(sc, caminho):
+    url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/{caminho}"
+    with urllib.request.urlopen(url, timeout=10) as resposta:
+        return json.loads(resposta.read())
+
+
+def estagios_do_grupo(sc, grupo):
+    """(job_id, stage_id, attempt_id, nº de tarefas) dos estágios executados no job group."""
+    rastreador = sc.statusTracker()
+    estagios = []
+    for job_id in rastreador.getJobIdsForGroup(grupo):
+        job = rastreador.getJobInfo(job_id)
+        for stage_id in (job.stageIds if job else []):
+            info = rastreador.getStageInfo(stage_id)
+            if info is not None and info.numTasks > 0:
+                estagios.append((job_id, stage_id, info.currentAttemptId, info.numTasks))
+    return estagios
+
+
+@contextmanager
+def job_group(spark, descricao):
+    """
+    Executa o bloco em um job group próprio (`descricao` + sufixo aleatório) e mede o tempo de parede.
+
+    Devolve um dict com "grupo"; "duracao_s" é preenchido ao sair do bloco.
+    """
+    sc = spark.sparkContext
+    execucao = {"grupo": f"{descricao}-{uuid.uuid4().hex[:8]}", "duracao_s": None}
+    sc.setJobGroup(execucao["grupo"], descricao)
+    inicio = time.time()
+    try:
+        yield execucao
+    finally:
+        sc.setLocalProperty("spark.jobGroup.id", None)
+        execucao["duracao_s"] = time.time() - inicio
+
+# COMMAND ----------
+
+def _linhas_metrica(no):
+    """Linhas de saída de um nó do plano ("number of output rows", ex.: "1,234"), ou None."""
+    for metrica in no.get("metrics", []):
+        if metrica["name"] == "number of output rows":
+            numero = re.match(r"[\d,]+", metrica["value"].strip())
+            return int(numero.group().replace(",", "")) if numero else None
+    return None
+
+
+def metricas_consultas(sc, job_ids, limiar_fanout=1.0):
+    """
+    Linhas lidas pelas fontes e joins (operador, entrada, saída, razão) das execuções SQL dos `job_ids`.
+
+    A entrada de um join é o maior dos lados (num join fato x dimensão, o fato). Nós sem contagem
+    de linhas (Exchange, Sort, leituras do AQE) são atravessados até o nó abaixo deles que tem a contagem.
+    """
+    execucoes = _api_spark_ui(sc, "sql?details=false&length=100000")
+    ids_execucoes = [
+        e["id"] for e in execucoes
+        if set(job_ids) & set(e.get("successJobIds", []) + e.get("failedJobIds", []) + e.get("runningJobIds", []))
+    ]
+
+    linhas_entrada = 0
+    joins = []
+    for id_execucao in ids_execucoes:
+        execucao = _api_spark_ui(sc, f"sql/{id_execucao}?details=true&planDescription=false")
+        nos = {no["nodeId"]: no for no in execucao["nodes"]}
+        filhos = {}
+        for aresta in execucao["edges"]:
+            # Arestas vão do filho (fromId) para o pai (toId)
+            filhos.setdefault(aresta["toId"], []).append(aresta["fromId"])
+
+        def _linhas(no_id):
+            linhas = _linhas_metrica(nos[no_id])
+            if linhas is None and filhos.get(no_id):
+                linhas = sum(_linhas(filho) or 0 for filho in filhos[no_id])
+            return linhas
+
+        pais = {aresta["toId"] for aresta in execucao["edges"]}
+        com_pai = {aresta["fromId"] for aresta in execucao["edges"]}
+        # Fontes: nós que alimentam outro e não têm filhos (os nós de WholeStageCodegen não têm arestas)
+        linhas_entrada += sum(_linhas_metrica(nos[no_id]) or 0 for no_id in com_pai - pais)
+
+        for no_id, no in nos.items():
+            if "Join" not in no["nodeName"] and no["nodeName"] != "CartesianProduct":
+                continue
+            entrada = max((_linhas(filho) or 0 for filho in filhos.get(no_id, [])), default=0)
+            saida = _linhas_metrica(no)
+            razao = saida / entrada if saida is not None and entrada else None
+            joins.append({"operador": no["nodeName"], "linhas_entrada": entrada,
+                          "linhas_saida": saida, "razao": razao})
+
+    alerta = any(j["razao"] is not None and j["razao"] > limiar_fanout for j in joins)
+    return linhas_entrada, joins, alerta
+
+
+def _linhas_resultado(resultado):
+    """Linhas de saída a partir do retorno da ação: count() devolve int; collect()/toPandas(), coleções."""
+    if isinstance(resultado, bool):
+        return None
+    if isinstance(resultado, int):
+        return resultado
+    if isinstance(resultado, (list, tuple, pd.DataFrame)):
+        return len(resultado)
+    return None
+
+# COMMAND ----------
+
+def medir_etapa(spark, etapa, acao, limiar_fanout=1.0, espera_metricas_s=1.0):
+    """
+    Executa `acao()` (que deve disparar a etapa: count(), collect(), write...) no job group `etapa`
+    e devolve (resultado, métricas da etapa) no formato de `schema_metricas_etapas`.
+
+    Se a Spark UI não estiver acessível, tempo, jobs e estágios são mantidos e as demais métricas ficam nulas.
+    """
+    sc = spark.sparkContext
+    with job_group(spark, etapa) as execucao:
+        resultado = acao()
+
+    estagios = estagios_do_grupo(sc, execucao["grupo"])
+    job_ids = sorted({job_id for job_id, _, _, _ in estagios})
+    metrica = {
+        "etapa": etapa,
+        "duracao_s": execucao["duracao_s"],
+        "job_ids": job_ids,
+        "stage_ids": [stage_id for _, stage_id, _, _ in estagios],
+        "tarefas": sum(tarefas for _, _, _, tarefas in estagios),
+        "shuffle_leitura_bytes": None,
+        "shuffle_escrita_bytes": None,
+        "spill_memoria_bytes": None,
+        "spill_disco_bytes": None,
+        "linhas_entrada": None,
+        "linhas_saida": _linhas_resultado(resultado),
+        "joins": [],
+        "alerta_fanout": None
+    }
+
+    # O status store da Spark UI é atualizado por um listener assíncrono
+    time.sleep(espera_metricas_s)
+    try:
+        dados = [_api_spark_ui(sc, f"stages/{stage_id}/{tentativa}") for _, stage_id, tentativa, _ in estagios]
+        metrica["shuffle_leitura_bytes"] = sum(d["shuffleReadBytes"] for d in dados)
+        metrica["shuffle_escrita_bytes"] = sum(d["shuffleWriteBytes"] for d in dados)
+        metrica["spill_memoria_bytes"] = sum(d["memoryBytesSpilled"] for d in dados)
+        metrica["spill_disco_bytes"] = sum(d["diskBytesSpilled"] for d in dados)
+        metrica["linhas_entrada"], metrica["joins"], metrica["alerta_fanout"] = metricas_consultas(
+            sc, job_ids, limiar_fanout
+        )
+    except (OSError, KeyError, ValueError):
+        # Spark UI indisponível (ex.: cluster sem acesso à porta da UI)
+        pass
+
+    if metrica["alerta_fanout"]:
+        print(f"[{etapa}] join com razão saída/entrada acima de {limiar_fanout}: "
+              f"{[j for j in metrica['joins'] if j['razao'] and j['razao'] > limiar_fanout]}")
+    return resultado, metrica
+
+
+def gravar_metricas_etapas(spark, metricas, caminho=CAMINHO_METRICAS_ETAPAS):
+    """Acrescenta as métricas de uma execução (mesmo `execucao_id`) à tabela Delta e as devolve em pandas."""
+    execucao_id = uuid.uuid4().hex
+    executado_em = datetime.now()
+    linhas = [{"execucao_id": execucao_id, "executado_em": executado_em, **m} for m in metricas]
+    spark.createDataFrame(linhas, schema_metricas_etapas).write.format("delta").mode("append").save(caminho)
+    return pd.DataFrame(linhas)
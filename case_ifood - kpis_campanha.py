@@ -0,0 +1,58 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###KPIs da Campanha
+# MAGIC
+# MAGIC Indicadores principais de target e control (clientes, clientes convertidos, pedidos, receita, média e variância do ticket) calculados em uma única agregação sobre os agregados diários (`case_ifood - agregados_diarios`).
+# MAGIC O resultado é um objeto pequeno em memória: os testes de conversão e ticket e a análise de viabilidade usam apenas esses números, sem novos jobs no cluster.
+# MAGIC
+# MAGIC As classes de KPIs (testes e viabilidade) estão em `campanha_cupons/kpis.py`, compartilhadas com o backend local; aqui fica só a agregação no Spark.
+
+# COMMAND ----------
+
+import pyspark.sql.functions as F
+
+# Dataclasses dos KPIs, testes e viabilidade ficam no pacote campanha_cupons (sem Spark)
+from campanha_cupons.kpis import KPIsGrupo, KPIsCampanha, kpis_de_somas
+
+# COMMAND ----------
+
+def calcular_kpis_campanha(df_agregado, df_ab_test, coluna_grupo="is_target"):
+    """
+    KPIs de target e control em uma única agregação sobre a união de clientes do teste A/B
+    (denominador da conversão) e dos agregados diários de pedidos
+    (`n_pedidos`, `n_valores`, `receita`, `receita_q` por cliente x dia).
+    """
+    df_clientes = df_ab_test.select(
+        "customer_id",
+        coluna_grupo,
+        F.lit(1).alias("eh_cliente"),
+        F.lit(0).cast("long").alias("n_pedidos"),
+        F.lit(0).cast("long").alias("n_valores"),
+        F.lit(None).cast("double").alias("receita"),
+        F.lit(None).cast("double").alias("receita_q")
+    )
+    df_pedidos = df_agregado.filter(F.col(coluna_grupo).isNotNull()).select(
+        "customer_id",
+        coluna_grupo,
+        F.lit(0).alias("eh_cliente"),
+        F.col("n_pedidos").cast("long"),
+        F.col("n_valores").cast("long"),
+        F.col("receita").cast("double"),
+        F.col("receita_q").cast("double")
+    )
+
+    linhas = (
+        df_clientes.unionByName(df_pedidos)
+        .groupBy(coluna_grupo)
+        .agg(
+            F.sum("eh_cliente").alias("clientes"),
+            F.countDistinct(F.when(F.col("n_pedidos") > 0, F.col("customer_id"))).alias("clientes_convertidos"),
+            F.sum("n_pedidos").alias("pedidos"),
+            F.sum("n_valores").alias("ticket_n"),
+            F.sum("receita").alias("ticket_soma"),
+            F.sum("receita_q").alias("ticket_soma_q")
+        )
+        .collect()
+    )
+
+    return kpis_de_somas(linhas, coluna_grupo)
@@ -0,0 +1,150 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Localização e Agregação com Chaves Concentradas
+# MAGIC
+# MAGIC O volume de pedidos é muito concentrado em poucos estados (SP domina), então as tarefas das chaves grandes atrasam os agrupamentos por localização enquanto as demais ficam ociosas.
+# MAGIC
+# MAGIC - `agregar_com_salt`: agregação em dois estágios. Primeiro agrupa por (chaves, salt), com o salt derivado do hash de `customer_id`, espalhando cada chave grande por `n_salt` tarefas. Depois combina os parciais por chave. Como o salt vem do cliente, contagens distintas de clientes também podem ser somadas entre salts.
+# MAGIC - `agregar_localizacao`: escolhe entre o agrupamento direto (com AQE) e o salgado, conforme a concentração da maior chave em uma amostra.
+# MAGIC - `localizacao_predominante`: localização do restaurante predominante por cliente em estado, cidade ou grade de latitude/longitude, lida dos agregados diários (mesma localização `merchant_*` dos segmentos). Agrupa por cliente e não por localização, então chaves mais finas não pioram a concentração.
+# MAGIC - `medir_tarefas`: tempo por tarefa (mediana, p95, máximo) dos estágios de uma ação, via API REST da Spark UI.
+# MAGIC
+# MAGIC Depende de `case_ifood - instrumentacao` (`job_group`, `estagios_do_grupo`). Use com `%run "./case_ifood - localizacao"`.
+
+# COMMAND ----------
+
+import pandas as pd
+import pyspark.sql.functions as F
+
+# COMMAND ----------
+
+def configurar_aqe(spark, fator_skew=5, limiar_skew="256MB"):
+    """Ativa o AQE com divisão de partições concentradas (joins) e coalescência de partições pequenas."""
+    spark.conf.set("spark.sql.adaptive.enabled", "true")
+    spark.conf.set("spark.sql.adaptive.coalescePartitions.enabled", "true")
+    spark.conf.set("spark.sql.adaptive.skewJoin.enabled", "true")
+    spark.conf.set("spark.sql.adaptive.skewJoin.skewedPartitionFactor", str(fator_skew))
+    spark.conf.set("spark.sql.adaptive.skewJoin.skewedPartitionThresholdInBytes", limiar_skew)
+
+
+def coluna_localizacao(nivel):
+    """
+    Chave de localização do restaurante nos agregados diários:
+    "estado", "cidade" (estado|cidade, evitando homônimos) ou "grade" (células de `TAMANHO_GRADE` graus).
+    """
+    if nivel == "estado":
+        return F.col("merchant_state")
+    if nivel == "cidade":
+        return F.concat_ws("|", "merchant_state", "merchant_city")
+    if nivel == "grade":
+        return F.col("celula_grade")
+    raise ValueError("nivel deve ser 'estado', 'cidade' ou 'grade'")
+
+
+def localizacao_predominante(df_agregado, nivel="estado"):
+    """Uma linha por cliente com a localização (do nível pedido) em que ele fez mais pedidos."""
+    return (
+        df_agregado
+        .select("customer_id", coluna_localizacao(nivel).alias("localizacao"), "n_pedidos")
+        .groupBy("customer_id", "localizacao")
+        .agg(F.sum("n_pedidos").alias("n_pedidos"))
+        .groupBy("customer_id")
+        .agg(F.max_by("localizacao", "n_pedidos").alias("segmento_localizacao"))
+    )
+
+# COMMAND ----------
+
+# Como combinar os parciais de cada agregação no segundo estágio
+_COMBINACAO = {"sum": "sum", "count": "sum", "count_distinct": "sum", "min": "min", "max": "max"}
+
+
+def _agregacao(operacao, coluna):
+    if operacao == "count_distinct":
+        return F.countDistinct(coluna)
+    if operacao == "count":
+        return F.count(coluna)
+    return getattr(F, operacao)(coluna)
+
+
+def agregar_com_salt(df, chaves, agregacoes, n_salt=32, coluna_salt="customer_id"):
+    """
+    Agregação em dois estágios por `chaves`.
+
+    `agregacoes` mapeia nome de saída -> (operação, coluna), com operação em
+    sum, count, count_distinct, min ou max. count_distinct só é exato sobre `coluna_salt`.
+    """
+    for nome, (operacao, coluna) in agregacoes.items():
+        if operacao not in _COMBINACAO:
+            raise ValueError(f"{nome}: operação '{operacao}' não pode ser combinada entre salts")
+        if operacao == "count_distinct" and coluna != coluna_salt:
+            raise ValueError(f"{nome}: count_distinct só é exato sobre a coluna do salt ({coluna_salt})")
+
+    parciais = (
+        df
+        .withColumn("_salt", F.pmod(F.xxhash64(coluna_salt), F.lit(n_salt)))
+        .groupBy(*chaves, "_salt")
+        .agg(*[_agregacao(op, col).alias(nome) for nome, (op, col) in agregacoes.items()])
+    )
+    return (
+        parciais
+        .groupBy(*chaves)
+        .agg(*[getattr(F, _COMBINACAO[op])(nome).alias(nome) for nome, (op, _) in agregacoes.items()])
+    )
+
+
+def concentracao_maior_chave(df, chave, fracao_amostra=0.01):
+    """Participação da chave mais frequente em uma amostra das linhas."""
+    contagens = df.sample(fracao_amostra, seed=42).groupBy(chave).count()
+    linha = contagens.agg(F.max("count").alias("maior"), F.sum("count").alias("total")).first()
+    return (linha["maior"] or 0) / linha["total"] if linha["total"] else 0.0
+
+
+def agregar_localizacao(df, chaves, agregacoes, chave_concentrada="segmento_localizacao",
+                        estrategia="auto", n_salt=32, limiar_concentracao=0.2, fracao_amostra=0.01):
+    """
+    Agrega por `chaves` tratando a concentração em `chave_concentrada`.
+
+    estrategia: "salt" (dois estágios), "aqe" (agrupamento direto, deixando o AQE ajustar as
+    partições) ou "auto" (salt se a maior chave passar de `limiar_concentracao` na amostra).
+    """
+    if estrategia == "auto":
+        concentracao = concentracao_maior_chave(df, chave_concentrada, fracao_amostra)
+        estrategia = "salt" if concentracao > limiar_concentracao else "aqe"
+
+    if estrategia == "salt":
+        return agregar_com_salt(df, chaves, agregacoes, n_salt=n_salt)
+    if estrategia == "aqe":
+        return df.groupBy(*chaves).agg(*[_agregacao(op, col).alias(nome) for nome, (op, col) in agregacoes.items()])
+    raise ValueError("estrategia deve ser 'auto', 'salt' ou 'aqe'")
+
+# COMMAND ----------
+
+def medir_tarefas(spark, descricao, acao):
+    """
+    Executa `acao()` em um job group próprio e devolve (resultado, resumo por estágio) com o tempo
+    de execução das tarefas (mediana, p95, máximo) e a razão máximo/mediana, que evidencia tarefas atrasadas.
+    """
+    sc = spark.sparkContext
+    with job_group(spark, descricao) as execucao:
+        resultado = acao()
+
+    linhas = []
+    for job_id, stage_id, tentativa, tarefas in estagios_do_grupo(sc, execucao["grupo"]):
+        try:
+            resumo = _api_spark_ui(sc, f"stages/{stage_id}/{tentativa}/taskSummary?quantiles=0.5,0.95,1.0")
+            mediana, p95, maximo = resumo["executorRunTime"]
+        except (OSError, KeyError, ValueError):
+            # Spark UI indisponível (ex.: cluster sem acesso à porta da UI)
+            mediana = p95 = maximo = None
+        linhas.append({
+            "descricao": descricao,
+            "job_id": job_id,
+            "stage_id": stage_id,
+            "tarefas": tarefas,
+            "mediana_ms": mediana,
+            "p95_ms": p95,
+            "max_ms": maximo,
+            "razao_max_mediana": maximo / mediana if mediana else None,
+            "duracao_acao_s": execucao["duracao_s"]
+        })
+    return resultado, pd.DataFrame(linhas)
@@ -0,0 +1,143 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Monitor do Teste A/B em Streaming
+# MAGIC
+# MAGIC Para o próximo teste (seções 1c e 3): consome novos arquivos de pedidos conforme chegam em `CAMINHO_STREAMING_ENTRADA`, mantém em estado as estatísticas suficientes do ticket por grupo e publica a cada micro-lote um p-valor sempre válido (mSPRT) e o lift estimado.
+# MAGIC
+# MAGIC - A atribuição target/control vem de `ab_test_ref_data`, em join estático com broadcast.
+# MAGIC - O estado da agregação tem uma linha por grupo (n, soma, soma dos quadrados), então o custo de cada atualização depende do tamanho do lote e não do histórico.
+# MAGIC - O p-valor publicado é o mínimo acumulado e o intervalo é a interseção acumulada dos intervalos, como exige o mSPRT. A campanha pode ser encerrada assim que `p_valor_sempre_valido < ALPHA`.
+# MAGIC - Cada linha do monitor leva o `consulta_id` gravado no checkpoint. A escrita é idempotente no Delta (`txnAppId` = consulta, `txnVersion` = `batch_id`): um lote reprocessado após falha não duplica linhas, e um checkpoint recriado (que reinicia o `batch_id` em 0) começa uma nova sequência em vez de ter os lotes descartados.
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - esquemas"
+
+# COMMAND ----------
+
+# MAGIC %run "./case_ifood - funcoes_estatisticas"
+
+# COMMAND ----------
+
+import json
+
+from delta.tables import DeltaTable
+import pyspark.sql.functions as F
+
+ALPHA = 0.05
+
+# Variância da mistura do mSPRT: efeito esperado no ticket de ~R$2,00 (ordem de grandeza), ao quadrado
+TAU2 = 2.0 ** 2
+
+# COMMAND ----------
+
+df_ab_test = spark.read.parquet(CAMINHO_PARQUET_AB_TEST).select("customer_id", "is_target")
+
+df_pedidos_stream = (
+    spark.readStream
+    .schema(esquema_texto(schema_orders))
+    .option("maxFilesPerTrigger", 1)
+    .json(CAMINHO_STREAMING_ENTRADA)
+)
+
+df_estatisticas_stream = (
+    aplicar_esquema(df_pedidos_stream, schema_orders)
+    .select("customer_id", "order_total_amount")
+    .join(F.broadcast(df_ab_test), "customer_id")
+    .groupBy("is_target")
+    .agg(*agregacoes_suficientes("order_total_amount", prefixo="ticket"))
+)
+
+# COMMAND ----------
+
+def _id_consulta(spark):
+    """Id da consulta no checkpoint: o mesmo a cada reinício, outro quando o checkpoint é recriado."""
+    return json.loads(spark.read.text(f"{CAMINHO_STREAMING_CHECKPOINT}/metadata").first()[0])["id"]
+
+
+def _ultimo_resultado(spark, consulta_id, batch_id):
+    """Última linha publicada pela mesma consulta antes de `batch_id` (estado acumulado do mSPRT)."""
+    if not DeltaTable.isDeltaTable(spark, CAMINHO_STREAMING_MONITOR):
+        return None
+    df_monitor = spark.read.format("delta").load(CAMINHO_STREAMING_MONITOR)
+    if "consulta_id" not in df_monitor.columns:
+        return None
+    return (
+        df_monitor
+        .filter((F.col("consulta_id") == consulta_id) & (F.col("batch_id") < batch_id))
+        .orderBy(F.col("batch_id").desc())
+        .first()
+    )
+
+
+def publicar_resultado(df_lote, batch_id):
+    """
+    Calcula o mSPRT sobre as estatísticas acumuladas e grava uma linha no monitor, de forma idempotente
+    por (consulta do checkpoint, batch_id).
+    """
+    spark = df_lote.sparkSession
+    consulta_id = _id_consulta(spark)
+    anterior = _ultimo_resultado(spark, consulta_id, batch_id)
+
+    grupos = {linha["is_target"]: linha for linha in df_lote.collect()}
+    if not {"target", "control"} <= grupos.keys():
+        return
+
+    estatisticas = {}
+    for grupo, linha in grupos.items():
+        media, variancia = media_variancia(linha["ticket_n"], linha["ticket_soma"], linha["ticket_soma_q"])
+        estatisticas[grupo] = (float(linha["ticket_n"]), float(media), float(variancia))
+
+    resultado = msprt_vetorizado(*estatisticas["target"], *estatisticas["control"], tau2=TAU2, alpha=ALPHA).iloc[0]
+
+    p_valor = float(resultado["p_valor_sempre_valido"])
+    ic_inferior = float(resultado["ic_inferior"])
+    ic_superior = float(resultado["ic_superior"])
+    if anterior is not None:
+        p_valor = min(p_valor, anterior["p_valor_sempre_valido"])
+        ic_inferior = max(ic_inferior, anterior["ic_inferior"])
+        ic_superior = min(ic_superior, anterior["ic_superior"])
+
+    media_controle = estatisticas["control"][1]
+    linha_monitor = [(
+        consulta_id,
+        int(batch_id),
+        int(estatisticas["target"][0]), int(estatisticas["control"][0]),
+        estatisticas["target"][1], media_controle,
+        float(resultado["diferenca"]),
+        float(resultado["diferenca"]) / media_controle if media_controle else None,
+        ic_inferior, ic_superior,
+        p_valor,
+        p_valor < ALPHA
+    )]
+    (
+        spark.createDataFrame(
+            linha_monitor,
+            "consulta_id string, batch_id long, target_n long, control_n long, target_mean double, control_mean double, "
+            "diferenca double, lift double, ic_inferior double, ic_superior double, "
+            "p_valor_sempre_valido double, significativo boolean"
+        )
+        .withColumn("atualizado_em", F.current_timestamp())
+        .write.format("delta").mode("append")
+        # Delta ignora a escrita se esta (txnAppId, txnVersion) já foi gravada
+        .option("txnAppId", f"monitor_teste_ab-{consulta_id}")
+        .option("txnVersion", int(batch_id))
+        .option("mergeSchema", "true")
+        .save(CAMINHO_STREAMING_MONITOR)
+    )
+
+# COMMAND ----------
+
+consulta_monitor = (
+    df_estatisticas_stream.writeStream
+    .outputMode("complete")
+    .foreachBatch(publicar_resultado)
+    .option("checkpointLocation", CAMINHO_STREAMING_CHECKPOINT)
+    .trigger(processingTime="1 minute")
+    .start()
+)
+
+# COMMAND ----------
+
+# Evolução do teste: a campanha pode ser encerrada na primeira linha com significativo = true
+display(spark.read.format("delta").load(CAMINHO_STREAMING_MONITOR).orderBy("atualizado_em"))
@@ -0,0 +1,99 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Simulador de Poder e Tamanho de Amostra
+# MAGIC
+# MAGIC Dimensiona os braços do próximo teste (seção 3: cupons de R$10/R$20/R$30, desconto fixo vs percentual) por Monte Carlo sobre a distribuição histórica do grupo control, que representa o comportamento sem cupom.
+# MAGIC
+# MAGIC - **Gasto por cliente** (com zeros de quem não comprou): cada experimento reamostra clientes do control para os dois braços e aplica o efeito relativo ao braço tratado (`gasto x (1 + efeito)`); teste de Welch.
+# MAGIC - **Conversão** (clientes com gasto > 0): reamostrar uma variável binária equivale a sortear uma binomial, então só as contagens de convertidos são simuladas, com taxa `p x (1 + efeito)` no braço tratado; teste z de proporções.
+# MAGIC - Os experimentos de cada desenho (segmento x métrica x efeito x tamanho) são simulados em lotes de matrizes numpy e testados de uma vez com `welch_vetorizado` / `ztest_proporcoes_vetorizado`. Os desenhos são distribuídos entre processos no driver; a função de cada processo (`simular_desenho`) fica em `campanha_cupons/estatisticas.py`, importável pelos processos com qualquer método de início (fork ou spawn).
+# MAGIC - Com vários braços comparados ao mesmo control, `n_comparacoes` aplica Bonferroni ao alpha.
+# MAGIC
+# MAGIC Use com `%run "./case_ifood - simulador_poder"`.
+
+# COMMAND ----------
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pyspark.sql.functions as F
+
+from campanha_cupons.estatisticas import inicializar_bases_simulacao, simular_desenho
+
+_SEGMENTO_TOTAL = "Total"
+
+# COMMAND ----------
+
+def base_simulacao(df_clientes, coluna_segmento=None, coluna_grupo="is_target", grupo="control"):
+    """
+    Gasto por cliente e conversão do `grupo` de referência, por segmento, para o simulador.
+
+    `df_clientes`: uma linha por cliente atribuído ao teste, com `gasto_total` (nulo para quem não
+    comprou). Retorna um dict {segmento: array de gasto por cliente}, com o total em "Total".
+    """
+    coluna = F.coalesce(F.col(coluna_segmento).cast("string"), F.lit("Sem segmento")) if coluna_segmento \
+        else F.lit(_SEGMENTO_TOTAL)
+    pdf = (
+        df_clientes
+        .filter(F.col(coluna_grupo) == grupo)
+        .select(
+            coluna.alias("segmento"),
+            F.coalesce(F.col("gasto_total"), F.lit(0.0)).cast("double").alias("gasto_total")
+        )
+        .toPandas()
+    )
+    bases = {_SEGMENTO_TOTAL: pdf["gasto_total"].to_numpy()}
+    if coluna_segmento:
+        bases.update({segmento: grupo_pdf.to_numpy() for segmento, grupo_pdf in pdf.groupby("segmento")["gasto_total"]})
+    return bases
+
+# COMMAND ----------
+
+def simular_poder(bases, efeitos, tamanhos, metricas=("gasto", "conversao"), n_simulacoes=20_000,
+                  alpha=0.05, n_comparacoes=1, semente=42, n_processos=None):
+    """
+    Curvas de poder para todas as combinações segmento x métrica x efeito relativo x clientes por braço.
+
+    `bases`: saída de `base_simulacao`. `n_comparacoes`: nº de braços tratados comparados ao control
+    (alpha de Bonferroni). Retorna um pandas DataFrame com uma linha por desenho.
+    """
+    alpha_ajustado = alpha / n_comparacoes
+    combinacoes = list(product(bases, metricas, efeitos, tamanhos))
+    sementes = np.random.SeedSequence(semente).spawn(len(combinacoes))
+    desenhos = [
+        (segmento, metrica, float(efeito), int(n), n_simulacoes, alpha_ajustado, semente_desenho)
+        for (segmento, metrica, efeito, n), semente_desenho in zip(combinacoes, sementes)
+    ]
+
+    with ProcessPoolExecutor(max_workers=n_processos, initializer=inicializar_bases_simulacao,
+                             initargs=(bases,)) as pool:
+        resultados = list(pool.map(simular_desenho, desenhos))
+
+    curvas = pd.DataFrame(resultados)
+    curvas["alpha"] = alpha_ajustado
+    return curvas
+
+# COMMAND ----------
+
+def efeito_minimo_detectavel(curvas, poder_alvo=0.8):
+    """Menor efeito relativo simulado com poder >= `poder_alvo`, por segmento, métrica e tamanho (NaN se nenhum)."""
+    return (
+        curvas[curvas["poder"] >= poder_alvo]
+        .groupby(["segmento", "metrica", "n_por_braco"])["efeito_relativo"].min()
+        .reindex(pd.MultiIndex.from_frame(curvas[["segmento", "metrica", "n_por_braco"]].drop_duplicates()))
+        .rename("efeito_minimo_detectavel")
+        .reset_index()
+    )
+
+
+def tamanho_minimo_amostra(curvas, poder_alvo=0.8):
+    """Menor nº de clientes por braço simulado com poder >= `poder_alvo`, por segmento, métrica e efeito (NaN se nenhum)."""
+    return (
+        curvas[curvas["poder"] >= poder_alvo]
+        .groupby(["segmento", "metrica", "efeito_relativo"])["n_por_braco"].min()
+        .reindex(pd.MultiIndex.from_frame(curvas[["segmento", "metrica", "efeito_relativo"]].drop_duplicates()))
+        .rename("n_minimo_por_braco")
+        .reset_index()
+    )
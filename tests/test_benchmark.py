@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from campanha_cupons.benchmark import executar_benchmark
+
+pytest.importorskip("duckdb")
+
+
+def _pastas(destino):
+    return sorted(p for p in os.listdir(destino) if p.startswith("fator_"))
+
+
+def test_bases_reaproveitadas_so_com_mesmos_parametros(tmp_path):
+    executar_benchmark(str(tmp_path), [0.001])
+    pasta, = _pastas(tmp_path)
+    pedidos = tmp_path / pasta / "order.json.gz"
+    gerado_em = os.path.getmtime(pedidos)
+
+    executar_benchmark(str(tmp_path), [0.001])
+    assert _pastas(tmp_path) == [pasta]
+    assert os.path.getmtime(pedidos) == gerado_em
+
+    executar_benchmark(str(tmp_path), [0.001], semente=1)
+    executar_benchmark(str(tmp_path), [0.001], expoente_estados=2.0)
+    assert len(_pastas(tmp_path)) == 3
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from campanha_cupons.estatisticas import SOMAS_BOOTSTRAP, intervalos_bootstrap
+
+
+def _somas_bootstrap(n_replicas=50, semente=0):
+    """Somas por (grupo, segmento, réplica) no formato de `bootstrap_poisson`, com a réplica 0 observada."""
+    rng = np.random.default_rng(semente)
+    linhas = []
+    for grupo in ("target", "control"):
+        for segmento in ("Ativo", "Inativo"):
+            for replica in range(n_replicas + 1):
+                clientes = 1000.0 if replica == 0 else rng.poisson(1000)
+                pedidos = 0.6 * clientes if replica == 0 else rng.poisson(0.6 * clientes)
+                linhas.append({
+                    "is_target": grupo,
+                    "segmento_atividade": segmento,
+                    "replica": replica,
+                    "soma_clientes": clientes,
+                    "soma_pedidos": pedidos,
+                    "soma_gasto": 40.0 * pedidos,
+                    "soma_convertidos": 0.4 * clientes
+                })
+    return pd.DataFrame(linhas)[["is_target", "segmento_atividade", "replica", *SOMAS_BOOTSTRAP]]
+
+
+def test_intervalos_bootstrap_sem_segmentos():
+    resultado = intervalos_bootstrap(_somas_bootstrap())
+
+    assert len(resultado) == 9  # 3 métricas x (target, control, lift)
+    ticket = resultado.set_index(["metrica", "alvo"]).loc[("ticket_medio", "target")]
+    assert ticket["estimativa"] == pytest.approx(40.0)
+    assert ticket["ic_inferior"] <= ticket["estimativa"] <= ticket["ic_superior"]
+    assert ticket["replicas_validas"] == 50
+
+
+def test_intervalos_bootstrap_por_segmento():
+    resultado = intervalos_bootstrap(_somas_bootstrap(), ["segmento_atividade"])
+
+    assert len(resultado) == 18
+    assert set(resultado["segmento_atividade"]) == {"Ativo", "Inativo"}
+    conversao = resultado.set_index(["segmento_atividade", "metrica", "alvo"]).loc[("Ativo", "taxa_conversao", "lift")]
+    assert conversao["estimativa"] == pytest.approx(0.0)
@@ -0,0 +1,40 @@
+import math
+
+import pandas as pd
+import pytest
+
+from campanha_cupons.kpis import kpis_de_somas
+
+
+def _somas(**control):
+    linhas = pd.DataFrame([
+        {"is_target": "target", "clientes": 100, "clientes_convertidos": 40, "pedidos": 90,
+         "ticket_n": 90, "ticket_soma": 3600.0, "ticket_soma_q": 160_000.0},
+        {"is_target": "control", "clientes": 80, "clientes_convertidos": 30, "pedidos": 60,
+         "ticket_n": 60, "ticket_soma": 2100.0, "ticket_soma_q": 80_000.0, **control}
+    ])
+    return linhas.to_dict("records")
+
+
+def test_kpis_de_somas():
+    kpis = kpis_de_somas(_somas())
+
+    assert kpis.target.taxa_conversao == pytest.approx(0.4)
+    assert kpis.target.ticket_medio == pytest.approx(40.0)
+    assert kpis.control.receita_por_cliente == pytest.approx(2100.0 / 80)
+    assert kpis.viabilidade(10, 0.20)["cupons_usados"] == 90
+
+
+def test_kpis_de_somas_grupo_sem_pedidos():
+    # Em pandas, SUM sem linhas chega como NaN (não None)
+    kpis = kpis_de_somas(_somas(clientes_convertidos=0, pedidos=0, ticket_n=0,
+                                ticket_soma=math.nan, ticket_soma_q=math.nan))
+
+    assert kpis.control.receita == 0.0
+    assert kpis.control.pedidos_com_valor == 0
+    assert math.isnan(kpis.control.ticket_medio)
+
+
+def test_kpis_de_somas_grupo_ausente():
+    with pytest.raises(ValueError, match="control"):
+        kpis_de_somas(_somas()[:1])
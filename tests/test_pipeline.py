@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+from statsmodels.stats.proportion import proportions_ztest
+
+from campanha_cupons.backends import criar_backend
+from campanha_cupons.estatisticas import ztest_proporcoes_vetorizado
+from campanha_cupons.pipeline import cubo_segmentos, executar_analise
+from campanha_cupons.sinteticos import gerar_bases
+
+pytest.importorskip("duckdb")
+
+
+@pytest.fixture(scope="module")
+def caminhos(tmp_path_factory):
+    return gerar_bases(str(tmp_path_factory.mktemp("bases")), fator_escala=0.002, com_itens=False,
+                       efeito_target=0.1, semente=7)
+
+
+@pytest.fixture(scope="module")
+def resultado(caminhos):
+    return executar_analise(criar_backend("duckdb"), caminhos)
+
+
+@pytest.fixture(scope="module")
+def pedidos(caminhos):
+    """Pedidos dos clientes do teste, com o grupo, lidos direto dos arquivos (referência independente do SQL)."""
+    orders = pd.read_json(caminhos["orders"], lines=True, compression="gzip", dtype={"customer_id": str})
+    ab_test = pd.read_csv(caminhos["ab_test"], dtype=str)
+    return orders[["customer_id", "order_total_amount"]].merge(ab_test, on="customer_id")
+
+
+def test_conversao_igual_statsmodels(resultado, caminhos, pedidos):
+    ab_test = pd.read_csv(caminhos["ab_test"], dtype=str)
+    compradores = set(pedidos["customer_id"])
+    clientes = ab_test.groupby("is_target")["customer_id"].agg(["size", lambda c: c.isin(compradores).sum()])
+    clientes.columns = ["clientes", "convertidos"]
+
+    z, p_valor = proportions_ztest(clientes.loc[["target", "control"], "convertidos"],
+                                   clientes.loc[["target", "control"], "clientes"])
+
+    assert resultado.kpis.target.clientes == clientes.loc["target", "clientes"]
+    assert resultado.kpis.control.clientes_convertidos == clientes.loc["control", "convertidos"]
+    assert resultado.teste_conversao[0] == pytest.approx(z)
+    assert resultado.teste_conversao[1] == pytest.approx(p_valor)
+
+    z_vetorizado, p_vetorizado = ztest_proporcoes_vetorizado(
+        [clientes.loc["target", "convertidos"]], [clientes.loc["target", "clientes"]],
+        [clientes.loc["control", "convertidos"]], [clientes.loc["control", "clientes"]]
+    )
+    assert z_vetorizado[0] == pytest.approx(z)
+    assert p_vetorizado[0] == pytest.approx(p_valor)
+
+
+def test_ticket_por_pedido_igual_scipy(resultado, pedidos):
+    valores = {g: pedidos.loc[pedidos["is_target"] == g, "order_total_amount"] for g in ("target", "control")}
+    esperado = stats.ttest_ind(valores["target"], valores["control"], equal_var=False)
+
+    assert resultado.teste_ticket["t_stat"] == pytest.approx(esperado.statistic)
+    assert resultado.teste_ticket["p_valor"] == pytest.approx(esperado.pvalue)
+    assert resultado.kpis.target.ticket_medio == pytest.approx(valores["target"].mean())
+
+
+def test_welch_por_cliente_igual_scipy(resultado, pedidos):
+    por_cliente = pedidos.groupby(["customer_id", "is_target"])["order_total_amount"].agg(
+        n_pedidos="size", gasto_total="sum", ticket_medio="mean"
+    ).reset_index()
+    testes = resultado.testes_clientes.set_index("metrica")
+
+    for metrica in ["ticket_medio", "n_pedidos", "gasto_total"]:
+        target = por_cliente.loc[por_cliente["is_target"] == "target", metrica]
+        control = por_cliente.loc[por_cliente["is_target"] == "control", metrica]
+        esperado = stats.ttest_ind(target, control, equal_var=False)
+
+        assert testes.loc[metrica, "t_stat"] == pytest.approx(esperado.statistic), metrica
+        assert testes.loc[metrica, "p_valor"] == pytest.approx(esperado.pvalue), metrica
+
+
+def test_cubo_total_igual_teste_ticket(resultado):
+    geral = resultado.cubo_segmentos[resultado.cubo_segmentos["nivel"] == "geral"].iloc[0]
+
+    # Clientes com pedido: o nível "geral" do cubo é o mesmo teste do ticket por pedido
+    assert geral["t_stat"] == pytest.approx(resultado.teste_ticket["t_stat"])
+    assert np.isfinite(geral["p_valor_ajustado"])
+
+
+def test_cubo_niveis_e_colunas_escolhidos():
+    rng = np.random.default_rng(3)
+    clientes = pd.DataFrame({
+        "is_target": np.repeat(["target", "control"], 200),
+        "regiao": np.tile(["norte", "sul"], 200),
+        "faixa": np.tile(["a", "a", "b", "b"], 100),
+        "gasto": rng.gamma(2.0, 20.0, 400)
+    })
+    clientes["n"], clientes["soma"], clientes["soma_q"] = 1, clientes["gasto"], clientes["gasto"] ** 2
+    backend = criar_backend("duckdb")
+    backend.conexao.register("base_cubo", clientes)
+
+    cubo = cubo_segmentos(backend, ["regiao", "faixa"], niveis=[(), ("faixa",)], tabela="base_cubo", filtro=None,
+                          n="n", soma="soma", soma_q="soma_q")
+
+    assert sorted(cubo["nivel"].unique()) == ["faixa", "geral"]
+    celula = cubo[(cubo["nivel"] == "faixa") & (cubo["faixa"] == "b")].iloc[0]
+    faixa_b = clientes[clientes["faixa"] == "b"]
+    esperado = stats.ttest_ind(faixa_b.loc[faixa_b["is_target"] == "target", "gasto"],
+                               faixa_b.loc[faixa_b["is_target"] == "control", "gasto"], equal_var=False)
+    assert celula["target_n"] == 100
+    assert celula["t_stat"] == pytest.approx(esperado.statistic)
+    assert celula["p_valor"] == pytest.approx(esperado.pvalue)
@@ -0,0 +1,37 @@
+import pytest
+
+from campanha_cupons.segmentos import (
+    expressao_localizacao_predominante,
+    expressao_segmento_atividade,
+    expressao_segmento_ticket
+)
+
+duckdb = pytest.importorskip("duckdb")
+
+
+def test_segmento_ticket():
+    faixas = duckdb.sql(f"""
+        SELECT ticket, {expressao_segmento_ticket("ticket")} AS faixa
+        FROM (VALUES (NULL), (39.99), (40.0), (69.99), (70.0)) t(ticket)
+        ORDER BY ticket NULLS FIRST
+    """).fetchall()
+
+    assert [faixa for _, faixa in faixas] == ["Sem histórico", "Bronze", "Prata", "Prata", "Ouro"]
+
+
+def test_segmento_atividade():
+    atividade = duckdb.sql(f"""
+        SELECT {expressao_segmento_atividade("ultimo", "2019-01-01", 30)}
+        FROM (VALUES (NULL), (TIMESTAMP '2018-12-01 23:59:59'), (TIMESTAMP '2018-12-02 00:00:00')) t(ultimo)
+    """).fetchall()
+
+    assert [a for (a,) in atividade] == ["Inativo", "Inativo", "Ativo"]
+
+
+def test_localizacao_predominante():
+    estado = duckdb.sql(f"""
+        SELECT {expressao_localizacao_predominante("estado", "pedidos")}
+        FROM (VALUES ('RJ', 2), ('SP', 5), ('MG', 1)) t(estado, pedidos)
+    """).fetchone()[0]
+
+    assert estado == "SP"